@@ -0,0 +1,211 @@
+# app/api.py
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from typing import Any, AsyncGenerator, Dict, Optional
+
+from bson import ObjectId
+from fastapi import Depends, FastAPI, HTTPException, Query
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from langchain_core.messages import HumanMessage, SystemMessage
+from pymongo.errors import DuplicateKeyError
+
+from app.config import MONGODB_ENSURE_INDEXES
+from app.models.api import (
+    LoginRequest, RegistrationRequest, StudentSession, ChatRequest, HistoryMessage, HistoryPage
+)
+from app.models.student import Student
+from app.services.auth import SessionStore, hash_password, verify_password
+from app.services.database import close_async_client
+from app.services.indexes import ensure_indexes
+from app.services.memory import MemoryService
+from app.services.mentor import MentorService
+from app.services.telemetry import telemetry
+
+CONVERSATION_ID_PREFIX = "<CONVERSATION_ID>"
+# Student document fields never returned by the API
+PRIVATE_STUDENT_FIELDS = {"password_hash"}
+
+bearer = HTTPBearer(auto_error=False)
+
+@lru_cache
+def get_memory_service() -> MemoryService:
+    return MemoryService()
+
+@lru_cache
+def get_mentor_service() -> MentorService:
+    return MentorService()
+
+@lru_cache
+def get_session_store() -> SessionStore:
+    return SessionStore()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if MONGODB_ENSURE_INDEXES:
+        result = await asyncio.to_thread(ensure_indexes)
+        for collection_name, error in result["errors"].items():
+            telemetry.error("indexes.ensure_failed", collection=collection_name, detail=error)
+    yield
+    await close_async_client()
+
+app = FastAPI(title="Horizon Mentor API", lifespan=lifespan)
+
+def _encode(document: Dict[str, Any]) -> Dict[str, Any]:
+    """JSON-safe copy of a MongoDB document"""
+    return jsonable_encoder(document, custom_encoder={ObjectId: str})
+
+async def _require_student(memory_service: MemoryService, student_id: str) -> Dict[str, Any]:
+    """Student by ID (stored under an ObjectId or a string), or 404"""
+    student = None
+    if ObjectId.is_valid(student_id):
+        student = await memory_service.get_student(ObjectId(student_id))
+    if student is None:
+        student = await memory_service.get_student(student_id)
+    if student is None:
+        raise HTTPException(status_code=404, detail="Student not found")
+    return student
+
+async def _session(memory_service: MemoryService, sessions: SessionStore, student: Dict[str, Any]) -> StudentSession:
+    """Start a session for an authenticated student"""
+    student_id = str(student["_id"])
+    return StudentSession(
+        student_id=student_id,
+        name=student.get("name", "Student"),
+        email=student.get("email", ""),
+        conversation_id=await memory_service.get_or_create_student_conversation(student_id),
+        token=await sessions.create(student_id)
+    )
+
+def _unauthorized(detail: str) -> HTTPException:
+    return HTTPException(status_code=401, detail=detail, headers={"WWW-Authenticate": "Bearer"})
+
+async def current_student(credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer),
+                          memory_service: MemoryService = Depends(get_memory_service),
+                          sessions: SessionStore = Depends(get_session_store)) -> Dict[str, Any]:
+    """The student whose session token authorizes the request, or 401"""
+    if credentials is None:
+        raise _unauthorized("Not authenticated")
+    student_id = await sessions.resolve(credentials.credentials)
+    if student_id is None:
+        raise _unauthorized("Invalid or expired session")
+    try:
+        return await _require_student(memory_service, student_id)
+    except HTTPException:
+        raise _unauthorized("Invalid or expired session")
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Metrics of this worker process in the Prometheus text format"""
+    return PlainTextResponse(telemetry.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+@app.post("/auth/register", response_model=StudentSession, status_code=201)
+async def register(request: RegistrationRequest,
+                   memory_service: MemoryService = Depends(get_memory_service),
+                   sessions: SessionStore = Depends(get_session_store)):
+    """Create a student and their conversation, and start a session"""
+    student = Student(**request.model_dump(exclude={"password"}))
+    # Hashing is deliberately slow, keep it off the event loop
+    password_hash = await asyncio.to_thread(hash_password, request.password)
+    try:
+        student_id = await memory_service.create_student(student, password_hash=password_hash)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail="A student with this email already exists")
+    return await _session(memory_service, sessions, await _require_student(memory_service, student_id))
+
+@app.post("/auth/login", response_model=StudentSession)
+async def login(request: LoginRequest,
+                memory_service: MemoryService = Depends(get_memory_service),
+                sessions: SessionStore = Depends(get_session_store)):
+    """Check the student's password and start a session"""
+    student = await memory_service.get_student_by_email(request.email)
+    password_hash = student.get("password_hash") if student else None
+    # Unknown emails and wrong passwords get the same answer
+    if not await asyncio.to_thread(verify_password, request.password, password_hash):
+        raise _unauthorized("Invalid email or password")
+    return await _session(memory_service, sessions, student)
+
+@app.post("/auth/logout", status_code=204)
+async def logout(credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer),
+                 sessions: SessionStore = Depends(get_session_store)):
+    """End the current session"""
+    if credentials is not None:
+        await sessions.revoke(credentials.credentials)
+
+@app.get("/me")
+async def get_profile(student: Dict[str, Any] = Depends(current_student)):
+    """The student's profile, including facts"""
+    return _encode({key: value for key, value in student.items() if key not in PRIVATE_STUDENT_FIELDS})
+
+@app.get("/me/facts")
+async def get_facts(student: Dict[str, Any] = Depends(current_student)):
+    """Facts known about the student, by category"""
+    return _encode(student.get("facts", {"academic": {}, "career": {}, "personal": {}}))
+
+@app.get("/me/history", response_model=HistoryPage)
+async def get_history(limit: int = Query(50, ge=1, le=200),
+                      before: Optional[str] = None,
+                      student: Dict[str, Any] = Depends(current_student),
+                      memory_service: MemoryService = Depends(get_memory_service)):
+    """Latest messages of the student's conversation, pageable backwards with `before`"""
+    if before is not None and not ObjectId.is_valid(before):
+        raise HTTPException(status_code=422, detail="Invalid message ID")
+    # Reading history must not create a conversation
+    conversation_id = await memory_service.find_student_conversation(str(student["_id"]))
+    if conversation_id is None:
+        return HistoryPage()
+    message_history = memory_service.get_message_history(conversation_id)
+    
+    page = await message_history.aget_tail(limit, before=before)
+    messages = [
+        HistoryMessage(
+            id=msg.id,
+            role="user" if isinstance(msg, HumanMessage) else "assistant",
+            content=msg.content
+        ) for msg in page if not isinstance(msg, SystemMessage)
+    ]
+    return HistoryPage(
+        conversation_id=conversation_id,
+        messages=messages,
+        next_before=page[0].id if len(page) == limit else None
+    )
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/me/chat")
+async def chat(request: ChatRequest,
+               student: Dict[str, Any] = Depends(current_student),
+               memory_service: MemoryService = Depends(get_memory_service),
+               mentor_service: MentorService = Depends(get_mentor_service)):
+    """Stream the mentor's reply as server-sent events: `token` events, then `done`"""
+    student_id = str(student["_id"])
+    if request.conversation_id is not None and not await memory_service.student_owns_conversation(
+        student_id, request.conversation_id
+    ):
+        # Same answer whether the conversation is someone else's or doesn't exist
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    
+    async def events() -> AsyncGenerator[str, None]:
+        try:
+            async for token in mentor_service.respond_to_student(
+                student_id, request.message, request.conversation_id
+            ):
+                if token.startswith(CONVERSATION_ID_PREFIX):
+                    conversation_id = token[len(CONVERSATION_ID_PREFIX):-len("</CONVERSATION_ID>")]
+                    yield _sse("done", {"conversation_id": conversation_id})
+                else:
+                    yield _sse("token", {"text": token})
+        except Exception as e:
+            telemetry.error("api.chat_failed", e, student_id=student_id)
+            yield _sse("error", {"detail": "The mentor could not respond"})
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # Ask reverse proxies not to buffer the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
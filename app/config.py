@@ -9,9 +9,156 @@ load_dotenv()
 MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017/")
 MONGODB_DB = os.getenv("MONGODB_DB", "student_mentors")
 
+# MongoDB connection pool (shared by every service in the process)
+MONGODB_MAX_POOL_SIZE = int(os.getenv("MONGODB_MAX_POOL_SIZE", "50"))
+MONGODB_MIN_POOL_SIZE = int(os.getenv("MONGODB_MIN_POOL_SIZE", "0"))
+MONGODB_MAX_IDLE_TIME_MS = int(os.getenv("MONGODB_MAX_IDLE_TIME_MS", "300000"))
+MONGODB_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGODB_WAIT_QUEUE_TIMEOUT_MS", "10000"))
+MONGODB_CONNECT_TIMEOUT_MS = int(os.getenv("MONGODB_CONNECT_TIMEOUT_MS", "5000"))
+MONGODB_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGODB_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+MONGODB_SOCKET_TIMEOUT_MS = int(os.getenv("MONGODB_SOCKET_TIMEOUT_MS", "30000"))
+
+# Create missing indexes when the app starts (see migrate.py)
+MONGODB_ENSURE_INDEXES = os.getenv("MONGODB_ENSURE_INDEXES", "True").lower() == "true"
+
+# In-process cache of student documents (profile and facts). Writes made in
+# other processes (facts extracted by the worker) show up after at most the TTL.
+STUDENT_CACHE_MAX_SIZE = int(os.getenv("STUDENT_CACHE_MAX_SIZE", "1024"))
+STUDENT_CACHE_TTL_SECONDS = float(os.getenv("STUDENT_CACHE_TTL_SECONDS", "15"))
+
 # Ollama Configuration
 OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3")
+# Prompt token budget for the mentor (also sent to Ollama as num_ctx)
+MENTOR_CONTEXT_TOKENS = int(os.getenv("MENTOR_CONTEXT_TOKENS", "4096"))
+# Part of the budget kept free for the generated reply
+MENTOR_RESPONSE_RESERVE_TOKENS = int(os.getenv("MENTOR_RESPONSE_RESERVE_TOKENS", "1024"))
+# Model and generation options per task. Models default to OLLAMA_MODEL; a
+# smaller model for background work keeps it off the mentor's model slot.
+# Ollama reloads a model whose num_ctx changes, so tasks sharing a model
+# should keep the same num_ctx.
+MENTOR_MODEL = os.getenv("MENTOR_MODEL", OLLAMA_MODEL)
+MENTOR_TEMPERATURE = float(os.getenv("MENTOR_TEMPERATURE", "0.7"))
+MENTOR_NUM_PREDICT = int(os.getenv("MENTOR_NUM_PREDICT", str(MENTOR_RESPONSE_RESERVE_TOKENS)))
+EXTRACTION_MODEL = os.getenv("EXTRACTION_MODEL", OLLAMA_MODEL)
+EXTRACTION_TEMPERATURE = float(os.getenv("EXTRACTION_TEMPERATURE", "0.2"))
+EXTRACTION_NUM_CTX = int(os.getenv("EXTRACTION_NUM_CTX", str(MENTOR_CONTEXT_TOKENS)))
+EXTRACTION_NUM_PREDICT = int(os.getenv("EXTRACTION_NUM_PREDICT", "512"))
+SUMMARY_MODEL = os.getenv("SUMMARY_MODEL", OLLAMA_MODEL)
+SUMMARY_TEMPERATURE = float(os.getenv("SUMMARY_TEMPERATURE", "0.3"))
+SUMMARY_NUM_CTX = int(os.getenv("SUMMARY_NUM_CTX", str(MENTOR_CONTEXT_TOKENS)))
+SUMMARY_NUM_PREDICT = int(os.getenv("SUMMARY_NUM_PREDICT", "400"))
+# Part of the budget the first messages of a conversation may use
+MENTOR_EARLY_CONTEXT_TOKENS = int(os.getenv("MENTOR_EARLY_CONTEXT_TOKENS", "512"))
+# Share of the history budget left free when the recent window is rebuilt, so
+# the next turns can append to it without changing the prompt prefix
+MENTOR_CONTEXT_SLACK = float(os.getenv("MENTOR_CONTEXT_SLACK", "0.25"))
+# Messages fetched per query when filling the budget with recent turns
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", "20"))
+# Rolling conversation summary: messages older than the mentor's recent
+# window are folded into it in batches of at most SUMMARY_MAX_BATCH. When the
+# window is unknown, the most recent SUMMARY_RECENT_MESSAGES count as the
+# window and messages are folded in once SUMMARY_MIN_BATCH have aged out.
+SUMMARY_RECENT_MESSAGES = int(os.getenv("SUMMARY_RECENT_MESSAGES", "20"))
+SUMMARY_MIN_BATCH = int(os.getenv("SUMMARY_MIN_BATCH", "10"))
+SUMMARY_MAX_BATCH = int(os.getenv("SUMMARY_MAX_BATCH", "40"))
+# Messages loaded per page in the chat view ("load older" fetches the next page)
+CHAT_PAGE_SIZE = int(os.getenv("CHAT_PAGE_SIZE", "30"))
+# Streaming replies are redrawn at most every STREAM_FLUSH_INTERVAL_MS, or
+# after STREAM_FLUSH_TOKENS new tokens, whichever comes first
+STREAM_FLUSH_INTERVAL_MS = int(os.getenv("STREAM_FLUSH_INTERVAL_MS", "80"))
+STREAM_FLUSH_TOKENS = int(os.getenv("STREAM_FLUSH_TOKENS", "20"))
+# Semantic memory: relevant older messages retrieved by embedding similarity
+SEMANTIC_MEMORY_ENABLED = os.getenv("SEMANTIC_MEMORY_ENABLED", "True").lower() == "true"
+# "ollama" uses EMBEDDING_MODEL through Ollama, "hashing" is a local embedder
+# without model calls (for tests and development)
+SEMANTIC_EMBEDDER = os.getenv("SEMANTIC_EMBEDDER", "ollama")
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "nomic-embed-text")
+SEMANTIC_MEMORY_TOP_K = int(os.getenv("SEMANTIC_MEMORY_TOP_K", "4"))
+SEMANTIC_MEMORY_MIN_SCORE = float(os.getenv("SEMANTIC_MEMORY_MIN_SCORE", "0.35"))
+# Part of the prompt budget reserved for recalled messages
+SEMANTIC_MEMORY_MAX_TOKENS = int(os.getenv("SEMANTIC_MEMORY_MAX_TOKENS", "400"))
+# Students whose vectors are kept in memory
+SEMANTIC_INDEX_CACHE_SIZE = int(os.getenv("SEMANTIC_INDEX_CACHE_SIZE", "256"))
+# Messages embedded per Ollama call when working through an embedding job
+SEMANTIC_INDEX_BATCH_SIZE = int(os.getenv("SEMANTIC_INDEX_BATCH_SIZE", "32"))
+# Refreshing an in-memory index re-reads vectors created this long before the
+# newest one it holds, since concurrent writers commit out of _id order
+SEMANTIC_INDEX_REFRESH_OVERLAP_SECONDS = float(os.getenv("SEMANTIC_INDEX_REFRESH_OVERLAP_SECONDS", "60"))
+# How long Ollama keeps the model (and its prompt cache) loaded between calls
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+# LLM admission control: concurrent requests per Ollama server (LLM_ENDPOINT_CONCURRENCY
+# overrides it per server as "url=n,url=n"), slots kept free of background
+# work for interactive replies, and queue bounds and timeouts per priority
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+LLM_ENDPOINT_CONCURRENCY = {
+    url.strip(): int(limit)
+    for url, limit in (item.rsplit("=", 1) for item in os.getenv("LLM_ENDPOINT_CONCURRENCY", "").split(",") if item)
+}
+LLM_INTERACTIVE_RESERVED_SLOTS = int(os.getenv("LLM_INTERACTIVE_RESERVED_SLOTS", "1"))
+LLM_MAX_QUEUE_INTERACTIVE = int(os.getenv("LLM_MAX_QUEUE_INTERACTIVE", "100"))
+LLM_MAX_QUEUE_BACKGROUND = int(os.getenv("LLM_MAX_QUEUE_BACKGROUND", "50"))
+LLM_QUEUE_TIMEOUT_INTERACTIVE_SECONDS = float(os.getenv("LLM_QUEUE_TIMEOUT_INTERACTIVE_SECONDS", "30"))
+LLM_QUEUE_TIMEOUT_BACKGROUND_SECONDS = float(os.getenv("LLM_QUEUE_TIMEOUT_BACKGROUND_SECONDS", "300"))
+# The limits above hold across processes (API, Streamlit, worker) through slot
+# leases in MongoDB; a process that dies frees its slots once the lease runs
+# out. With LLM_SHARED_SLOTS=false each process enforces them on its own, so
+# give the worker a lower LLM_MAX_CONCURRENCY than the interactive processes.
+LLM_SHARED_SLOTS = os.getenv("LLM_SHARED_SLOTS", "True").lower() == "true"
+LLM_SLOT_LEASE_SECONDS = float(os.getenv("LLM_SLOT_LEASE_SECONDS", "60"))
+# Longest pause between attempts while waiting for a shared slot (background waits poll 4x slower)
+LLM_SLOT_POLL_SECONDS = float(os.getenv("LLM_SLOT_POLL_SECONDS", "0.25"))
+# HTTP connection pool shared by all LLM clients talking to one Ollama server
+OLLAMA_MAX_CONNECTIONS = int(os.getenv("OLLAMA_MAX_CONNECTIONS", "20"))
+OLLAMA_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("OLLAMA_MAX_KEEPALIVE_CONNECTIONS", "10"))
+
+# Background job queue (stored in MongoDB, processed by worker.py)
+JOB_QUEUE_MAX_PENDING = int(os.getenv("JOB_QUEUE_MAX_PENDING", "1000"))
+# Queued turns coalesced into one job; older ones are dropped beyond this
+JOB_MAX_ITEMS = int(os.getenv("JOB_MAX_ITEMS", "10"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETRY_BACKOFF_SECONDS = float(os.getenv("JOB_RETRY_BACKOFF_SECONDS", "10"))
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "300"))
+JOB_POLL_INTERVAL_SECONDS = float(os.getenv("JOB_POLL_INTERVAL_SECONDS", "1.0"))
+JOB_FAILED_TTL_SECONDS = int(os.getenv("JOB_FAILED_TTL_SECONDS", str(7 * 24 * 3600)))
+
+# Fact extraction workers
+EXTRACTION_WORKER_CONCURRENCY = int(os.getenv("EXTRACTION_WORKER_CONCURRENCY", "2"))
+# Start worker.py alongside the Streamlit app in main.py
+RUN_EXTRACTION_WORKER = os.getenv("RUN_EXTRACTION_WORKER", "True").lower() == "true"
+# Turns scoring below the threshold are not sent to fact extraction
+FACT_GATE_ENABLED = os.getenv("FACT_GATE_ENABLED", "True").lower() == "true"
+FACT_GATE_THRESHOLD = float(os.getenv("FACT_GATE_THRESHOLD", "1.0"))
+# Extraction results cached by their inputs (in memory, and in MongoDB with a TTL)
+EXTRACTION_CACHE_MAX_SIZE = int(os.getenv("EXTRACTION_CACHE_MAX_SIZE", "1000"))
+EXTRACTION_CACHE_TTL_SECONDS = int(os.getenv("EXTRACTION_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+# Changes kept per fact in fact_history (older ones are dropped)
+FACT_HISTORY_MAX_CHANGES = int(os.getenv("FACT_HISTORY_MAX_CHANGES", "20"))
+# Existing facts sent with each extraction prompt (the most relevant to the turns)
+EXTRACTION_MAX_FACTS = int(os.getenv("EXTRACTION_MAX_FACTS", "15"))
+# Part of EXTRACTION_NUM_CTX those facts may use; queued turns that don't fit
+# the rest are split across several extraction calls
+EXTRACTION_FACTS_MAX_TOKENS = int(os.getenv("EXTRACTION_FACTS_MAX_TOKENS", "400"))
+
+# ASGI service (serve.py)
+# Listens on localhost only unless exposed explicitly (e.g. API_HOST=0.0.0.0 behind a proxy)
+API_HOST = os.getenv("API_HOST", "127.0.0.1")
+API_PORT = int(os.getenv("API_PORT", "8000"))
+API_WORKERS = int(os.getenv("API_WORKERS", "4"))
+# Lifetime of the bearer tokens issued at login
+API_SESSION_TTL_SECONDS = int(os.getenv("API_SESSION_TTL_SECONDS", str(7 * 24 * 3600)))
+
+# Telemetry: spans and counters exported in Prometheus text format. When
+# disabled, spans and counters are no-ops; log events are still written.
+TELEMETRY_ENABLED = os.getenv("TELEMETRY_ENABLED", "True").lower() == "true"
+# Write log events as JSON lines instead of plain text
+TELEMETRY_JSON_LOGS = os.getenv("TELEMETRY_JSON_LOGS", "False").lower() == "true"
+# Also log every finished span (verbose)
+TELEMETRY_LOG_SPANS = os.getenv("TELEMETRY_LOG_SPANS", "False").lower() == "true"
+# Address and port of the worker's /metrics endpoint (port 0 disables it); like
+# the API it listens on localhost only unless exposed explicitly
+WORKER_METRICS_HOST = os.getenv("WORKER_METRICS_HOST", "127.0.0.1")
+WORKER_METRICS_PORT = int(os.getenv("WORKER_METRICS_PORT", "0"))
 
 # System Configuration
 DEBUG = os.getenv("DEBUG", "False").lower() == "true"
\ No newline at end of file
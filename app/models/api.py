@@ -0,0 +1,40 @@
+# app/models/api.py
+from pydantic import BaseModel, Field
+from typing import List, Optional
+
+class LoginRequest(BaseModel):
+    email: str
+    password: str
+
+class RegistrationRequest(BaseModel):
+    name: str
+    email: str
+    university: Optional[str] = None
+    program: Optional[str] = None
+    year: Optional[int] = None
+    password: str = Field(min_length=8)
+
+class StudentSession(BaseModel):
+    student_id: str
+    name: str
+    email: str
+    conversation_id: str
+    # Send as "Authorization: Bearer <token>"
+    token: str
+    token_type: str = "bearer"
+
+class ChatRequest(BaseModel):
+    message: str = Field(min_length=1)
+    conversation_id: Optional[str] = None
+
+class HistoryMessage(BaseModel):
+    id: Optional[str] = None
+    role: str
+    content: str
+
+class HistoryPage(BaseModel):
+    # None until the student's first conversation exists
+    conversation_id: Optional[str] = None
+    messages: List[HistoryMessage] = []
+    # Pass as `before` to get the preceding page; None when there is none
+    next_before: Optional[str] = None
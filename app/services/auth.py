@@ -0,0 +1,79 @@
+# app/services/auth.py
+import hashlib
+import hmac
+import secrets
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from app.config import API_SESSION_TTL_SECONDS
+from app.services.database import get_async_database
+
+SESSIONS_COLLECTION = "sessions"
+
+# scrypt cost parameters (about 16 MB and a few tens of ms per hash)
+SCRYPT_N = 2 ** 14
+SCRYPT_R = 8
+SCRYPT_P = 1
+# Verified against when there is no stored hash, so unknown accounts take as long as wrong passwords
+_DUMMY_SALT = b"\0" * 16
+
+def hash_password(password: str) -> str:
+    """Salted scrypt hash, stored as scrypt$n$r$p$salt$hash"""
+    salt = secrets.token_bytes(16)
+    digest = hashlib.scrypt(password.encode(), salt=salt, n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P)
+    return "$".join(["scrypt", str(SCRYPT_N), str(SCRYPT_R), str(SCRYPT_P), salt.hex(), digest.hex()])
+
+def verify_password(password: str, password_hash: Optional[str]) -> bool:
+    """Check a password against a stored hash; False when there is none"""
+    try:
+        scheme, n, r, p, salt, expected = (password_hash or "").split("$")
+        if scheme != "scrypt":
+            raise ValueError(scheme)
+    except ValueError:
+        hashlib.scrypt(password.encode(), salt=_DUMMY_SALT, n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P)
+        return False
+    digest = hashlib.scrypt(password.encode(), salt=bytes.fromhex(salt), n=int(n), r=int(r), p=int(p))
+    return hmac.compare_digest(digest.hex(), expected)
+
+def _token_key(token: str) -> str:
+    # Only a hash of the token is stored, so a database dump holds no usable tokens
+    return hashlib.sha256(token.encode()).hexdigest()
+
+class SessionStore:
+    """Opaque bearer tokens for API sessions.
+    
+    Sessions live in MongoDB, so every API worker process resolves the same
+    tokens; a TTL index removes them once they expire.
+    """
+    
+    def __init__(self, collection_name: str = SESSIONS_COLLECTION, ttl_seconds: int = API_SESSION_TTL_SECONDS):
+        self.collection_name = collection_name
+        self.ttl_seconds = ttl_seconds
+    
+    @property
+    def sessions(self):
+        return get_async_database()[self.collection_name]
+    
+    async def create(self, student_id: str) -> str:
+        """Start a session for a student and return its token"""
+        token = secrets.token_urlsafe(32)
+        now = datetime.now(timezone.utc)
+        await self.sessions.insert_one({
+            "_id": _token_key(token),
+            "student_id": student_id,
+            "created_at": now,
+            "expires_at": now + timedelta(seconds=self.ttl_seconds)
+        })
+        return token
+    
+    async def resolve(self, token: str) -> Optional[str]:
+        """Student ID of a live session, or None"""
+        session = await self.sessions.find_one({
+            "_id": _token_key(token),
+            "expires_at": {"$gt": datetime.now(timezone.utc)}
+        })
+        return session["student_id"] if session else None
+    
+    async def revoke(self, token: str) -> None:
+        """End a session"""
+        await self.sessions.delete_one({"_id": _token_key(token)})
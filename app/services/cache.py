@@ -0,0 +1,107 @@
+# app/services/cache.py
+import copy
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from app.services.telemetry import telemetry
+
+class VersionedLRUCache:
+    """Thread-safe in-process LRU cache with TTL expiry and per-key versions.
+    
+    Readers take the key's version before loading from the database and pass
+    it back to set(); if a writer invalidated the key in the meantime the
+    (possibly stale) value is not stored.
+    
+    Versions come from one counter bumped by every invalidation, and only the
+    last max_size invalidated keys are remembered; a load that started before
+    a forgotten invalidation is not stored, so the bookkeeping stays bounded.
+    """
+    
+    def __init__(self, max_size: int, ttl_seconds: float, name: str = "cache"):
+        self.name = name
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        # Counter value of each key's last invalidation, oldest first
+        self._invalidated: "OrderedDict[Hashable, int]" = OrderedDict()
+        self._clock = 0
+        # Loads that started before this counter value are never stored
+        self._floor = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def version(self, key: Hashable) -> int:
+        """Version to pass to set() for a load of the key starting now"""
+        with self._lock:
+            return self._clock
+    
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Get a copy of a cached value, or None on a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                hit = False
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                hit = True
+                value = entry[1]
+        telemetry.incr("cache_requests_total", cache=self.name, result="hit" if hit else "miss")
+        if not hit:
+            return None
+        # Callers may mutate what they get back
+        return copy.deepcopy(value)
+    
+    def set(self, key: Hashable, value: Any, version: int) -> bool:
+        """Store a value loaded at the given version, unless the key changed since"""
+        if self.max_size <= 0:
+            return False
+        value = copy.deepcopy(value)
+        with self._lock:
+            if version < self._floor or self._invalidated.get(key, 0) > version:
+                return False
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return True
+    
+    def invalidate(self, key: Hashable) -> None:
+        """Drop a key and bump its version so in-flight loads are not stored"""
+        with self._lock:
+            self._entries.pop(key, None)
+            self._clock += 1
+            self._invalidated[key] = self._clock
+            self._invalidated.move_to_end(key)
+            while len(self._invalidated) > max(self.max_size, 1):
+                _, forgotten = self._invalidated.popitem(last=False)
+                self._floor = max(self._floor, forgotten)
+    
+    def clear(self) -> None:
+        """Drop every entry"""
+        with self._lock:
+            self._entries.clear()
+            self._invalidated.clear()
+            self._clock += 1
+            self._floor = self._clock
+    
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss statistics"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,198 @@
+# app/services/context.py
+import math
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Set
+
+from langchain_core.messages import BaseMessage, SystemMessage
+
+from app.config import (
+    MENTOR_CONTEXT_TOKENS, MENTOR_RESPONSE_RESERVE_TOKENS,
+    MENTOR_EARLY_CONTEXT_TOKENS, MENTOR_CONTEXT_SLACK, HISTORY_PAGE_SIZE
+)
+from app.services.history import AsyncMongoDBChatMessageHistory
+
+# Rough token estimate for Llama-style tokenizers on English text; exact counts
+# would need a round trip to the model server per message
+CHARS_PER_TOKEN = 4
+# Role markers and separators added around each message
+MESSAGE_OVERHEAD_TOKENS = 4
+# First messages of the conversation considered as early context
+EARLY_CONTEXT_MESSAGES = 3
+# Messages read from the start of the conversation to find the system
+# message(s) and the early context
+HISTORY_HEAD_SCAN = 8
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the number of tokens in a text"""
+    return math.ceil(len(text) / CHARS_PER_TOKEN) if text else 0
+
+class TokenCounter:
+    """Token estimates for messages, cached by message ID (stored messages never change)"""
+    
+    def __init__(self, max_size: int = 10000):
+        self.max_size = max_size
+        self._counts: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def count(self, message: BaseMessage) -> int:
+        """Tokens used by a message in the prompt"""
+        if message.id is None:
+            return self._estimate(message)
+        
+        with self._lock:
+            count = self._counts.get(message.id)
+            if count is not None:
+                self._counts.move_to_end(message.id)
+                return count
+        
+        count = self._estimate(message)
+        with self._lock:
+            self._counts[message.id] = count
+            while len(self._counts) > self.max_size:
+                self._counts.popitem(last=False)
+        return count
+    
+    def _estimate(self, message: BaseMessage) -> int:
+        content = message.content if isinstance(message.content, str) else str(message.content)
+        return estimate_tokens(content) + MESSAGE_OVERHEAD_TOKENS
+
+# Shared so the cache survives across turns and services
+token_counter = TokenCounter()
+
+class ContextAssembler:
+    """Selects conversation history for the prompt within a token budget.
+    
+    The budget covers the system prompt (including the student profile), the
+    early context of the conversation, the most recent turns and the new
+    message, leaving room for the response.
+    
+    To keep the prompt prefix stable between turns (so Ollama can reuse its
+    KV cache), the oldest recent message is remembered per conversation and
+    the window keeps starting there for as long as everything fits. When it
+    no longer fits, the window is refilled leaving some slack, which then
+    absorbs the next few turns.
+    """
+    
+    def __init__(self,
+                 budget: int = MENTOR_CONTEXT_TOKENS,
+                 response_reserve: int = MENTOR_RESPONSE_RESERVE_TOKENS,
+                 early_budget: int = MENTOR_EARLY_CONTEXT_TOKENS,
+                 page_size: int = HISTORY_PAGE_SIZE,
+                 slack: float = MENTOR_CONTEXT_SLACK,
+                 max_anchors: int = 10000):
+        self.budget = budget
+        self.response_reserve = response_reserve
+        self.early_budget = early_budget
+        self.page_size = page_size
+        self.slack = slack
+        self.max_anchors = max_anchors
+        self._anchors: "OrderedDict[str, str]" = OrderedDict()
+    
+    async def assemble(self,
+                       message_history: AsyncMongoDBChatMessageHistory,
+                       system_prompt: str,
+                       message: str,
+                       summarized_through: Optional[str] = None,
+                       reserved_tokens: int = 0) -> List[BaseMessage]:
+        """Return history messages (oldest first) that fit the budget.
+        
+        Messages up to summarized_through are covered by the conversation
+        summary in the system prompt and are not repeated. reserved_tokens
+        are kept free for other prompt content (e.g. recalled messages).
+        """
+        available = (self.budget - self.response_reserve - reserved_tokens
+                     - estimate_tokens(system_prompt) - estimate_tokens(message)
+                     - 2 * MESSAGE_OVERHEAD_TOKENS)
+        
+        # Stored system messages and the first messages of the conversation
+        head = await message_history.aget_head(HISTORY_HEAD_SCAN)
+        system_messages = [msg for msg in head if isinstance(msg, SystemMessage)]
+        available -= sum(token_counter.count(msg) for msg in system_messages)
+        
+        early_context = []
+        early_remaining = min(self.early_budget, available)
+        for msg in [msg for msg in head if not isinstance(msg, SystemMessage)][:EARLY_CONTEXT_MESSAGES]:
+            tokens = token_counter.count(msg)
+            if tokens > early_remaining:
+                break
+            early_context.append(msg)
+            early_remaining -= tokens
+            available -= tokens
+        
+        # Fill the rest with the most recent messages
+        included_ids = {msg.id for msg in system_messages + early_context}
+        session_id = message_history.session_id
+        anchor = self._anchors.get(session_id)
+        if anchor and summarized_through and anchor <= summarized_through:
+            anchor = None
+        
+        recent = None
+        if anchor:
+            # Reuse last turn's window start if everything since then still fits
+            recent = await self._fill_recent(message_history, available, included_ids,
+                                             summarized_through, anchor=anchor)
+        if recent is None:
+            # Start a new window, leaving slack for the next turns
+            recent = await self._fill_recent(message_history, int(available * (1 - self.slack)),
+                                             included_ids, summarized_through)
+        
+        self._set_anchor(session_id, recent[-1].id if recent and recent[-1].id else None)
+        recent.reverse()
+        
+        return system_messages + early_context + recent
+    
+    async def _fill_recent(self,
+                           message_history: AsyncMongoDBChatMessageHistory,
+                           available: int,
+                           included_ids: Set[str],
+                           summarized_through: Optional[str],
+                           anchor: Optional[str] = None) -> Optional[List[BaseMessage]]:
+        """Collect recent messages newest first, paging backwards until the budget is
+        used up, the early context or summary is reached, or (if given) the anchor
+        message is included. Returns None if the anchor could not be reached."""
+        recent: List[BaseMessage] = []
+        before: Optional[str] = None
+        while True:
+            page = await message_history.aget_tail(self.page_size, before=before)
+            for msg in reversed(page):
+                if msg.id in included_ids or (summarized_through and msg.id <= summarized_through):
+                    # Everything older is already in the early context or the summary
+                    return recent
+                if anchor and msg.id < anchor:
+                    return recent
+                if isinstance(msg, SystemMessage):
+                    continue
+                tokens = token_counter.count(msg)
+                if tokens > available:
+                    if anchor:
+                        return None
+                    if not recent and available > MESSAGE_OVERHEAD_TOKENS:
+                        # The latest message alone is too large, keep its end
+                        recent.append(self._truncate(msg, available))
+                    return recent
+                recent.append(msg)
+                available -= tokens
+            if len(page) < self.page_size:
+                return recent
+            before = page[0].id
+    
+    def window_start(self, session_id: str) -> Optional[str]:
+        """ID of the oldest message in the recent window last assembled for a
+        conversation; older messages are only in the prompt through the summary"""
+        return self._anchors.get(session_id)
+    
+    def _set_anchor(self, session_id: str, anchor: Optional[str]) -> None:
+        if anchor is None:
+            self._anchors.pop(session_id, None)
+            return
+        self._anchors[session_id] = anchor
+        self._anchors.move_to_end(session_id)
+        while len(self._anchors) > self.max_anchors:
+            self._anchors.popitem(last=False)
+    
+    def _truncate(self, message: BaseMessage, tokens: int) -> BaseMessage:
+        """Copy of a message cut down to roughly the given number of tokens"""
+        keep_chars = max(0, (tokens - MESSAGE_OVERHEAD_TOKENS) * CHARS_PER_TOKEN)
+        content = message.content if isinstance(message.content, str) else str(message.content)
+        return message.model_copy(update={"content": "..." + content[-keep_chars:], "id": None})
@@ -0,0 +1,76 @@
+# app/services/database.py
+import asyncio
+import threading
+import weakref
+from typing import Any, Dict, List, Optional
+
+from pymongo import AsyncMongoClient, MongoClient
+
+from app.config import (
+    MONGODB_URI, MONGODB_DB,
+    MONGODB_MAX_POOL_SIZE, MONGODB_MIN_POOL_SIZE, MONGODB_MAX_IDLE_TIME_MS,
+    MONGODB_WAIT_QUEUE_TIMEOUT_MS, MONGODB_CONNECT_TIMEOUT_MS,
+    MONGODB_SERVER_SELECTION_TIMEOUT_MS, MONGODB_SOCKET_TIMEOUT_MS
+)
+
+# Process-wide client registry. Async clients are bound to the event loop
+# they were created on, so there is one pooled client per loop; synchronous
+# code (e.g. the Streamlit debug panel) shares a single pooled client.
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncMongoClient]" = weakref.WeakKeyDictionary()
+_sync_client: Optional[MongoClient] = None
+_lock = threading.Lock()
+# pymongo monitoring listeners (e.g. a CommandListener counting operations)
+_event_listeners: List[Any] = []
+
+def add_event_listener(listener: Any) -> None:
+    """Register a pymongo event listener on clients created from now on"""
+    with _lock:
+        _event_listeners.append(listener)
+
+def client_options() -> Dict[str, Any]:
+    """Connection pool and timeout settings shared by all clients"""
+    return {
+        "maxPoolSize": MONGODB_MAX_POOL_SIZE,
+        "minPoolSize": MONGODB_MIN_POOL_SIZE,
+        "maxIdleTimeMS": MONGODB_MAX_IDLE_TIME_MS,
+        "waitQueueTimeoutMS": MONGODB_WAIT_QUEUE_TIMEOUT_MS,
+        "connectTimeoutMS": MONGODB_CONNECT_TIMEOUT_MS,
+        "serverSelectionTimeoutMS": MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+        "socketTimeoutMS": MONGODB_SOCKET_TIMEOUT_MS or None,
+        "event_listeners": list(_event_listeners),
+    }
+
+def get_async_client() -> AsyncMongoClient:
+    """Get the shared async client for the running event loop"""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        with _lock:
+            client = _async_clients.get(loop)
+            if client is None:
+                client = AsyncMongoClient(MONGODB_URI, **client_options())
+                _async_clients[loop] = client
+    return client
+
+def get_async_database():
+    """Get the application database on the shared async client"""
+    return get_async_client()[MONGODB_DB]
+
+def get_sync_client() -> MongoClient:
+    """Get the shared synchronous client"""
+    global _sync_client
+    if _sync_client is None:
+        with _lock:
+            if _sync_client is None:
+                _sync_client = MongoClient(MONGODB_URI, **client_options())
+    return _sync_client
+
+def get_sync_database():
+    """Get the application database on the shared synchronous client"""
+    return get_sync_client()[MONGODB_DB]
+
+async def close_async_client() -> None:
+    """Close the async client of the running event loop, if any"""
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.close()
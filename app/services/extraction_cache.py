@@ -0,0 +1,75 @@
+# app/services/extraction_cache.py
+import hashlib
+import json
+import re
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from app.config import EXTRACTION_CACHE_MAX_SIZE, EXTRACTION_CACHE_TTL_SECONDS
+from app.services.cache import VersionedLRUCache
+from app.services.database import get_async_database
+from app.services.telemetry import telemetry
+
+def extraction_cache_key(conversation: str, existing_facts: Dict[str, Any], model: str, prompt_version: int) -> str:
+    """Hash of everything that determines an extraction result"""
+    payload = json.dumps({
+        # Whitespace differences (e.g. from reruns) don't change the result
+        "conversation": re.sub(r"\s+", " ", conversation).strip(),
+        "existing_facts": existing_facts,
+        "model": model,
+        "prompt_version": prompt_version
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+class ExtractionCache:
+    """Content-addressed extraction results: a local LRU in front of a MongoDB collection.
+    
+    Documents expire through the created_at TTL index, so the collection stays
+    bounded; the local LRU holds the most recently used results.
+    """
+    
+    def __init__(self, collection_name: str = "extraction_cache",
+                 max_size: int = EXTRACTION_CACHE_MAX_SIZE,
+                 ttl_seconds: float = EXTRACTION_CACHE_TTL_SECONDS):
+        self.collection_name = collection_name
+        self.local = VersionedLRUCache(max_size, ttl_seconds, name="extraction")
+    
+    @property
+    def collection(self):
+        return get_async_database()[self.collection_name]
+    
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Cached result for a key, or None"""
+        result = self.local.get(key)
+        if result is not None:
+            return result
+        
+        version = self.local.version(key)
+        try:
+            document = await self.collection.find_one({"_id": key})
+        except Exception as e:
+            telemetry.error("extraction_cache.read_failed", e)
+            return None
+        if document is None:
+            return None
+        self.local.set(key, document["result"], version)
+        return document["result"]
+    
+    async def set(self, key: str, result: Dict[str, Any], **metadata: Any) -> None:
+        """Store a result; failures only cost a future cache miss"""
+        self.local.set(key, result, self.local.version(key))
+        try:
+            await self.collection.replace_one(
+                {"_id": key},
+                {"result": result, "created_at": datetime.now(), **metadata},
+                upsert=True
+            )
+        except Exception as e:
+            telemetry.error("extraction_cache.write_failed", e)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Local cache statistics"""
+        return self.local.stats()
+
+# Shared so every IntelligenceService in the process uses one local cache
+extraction_cache = ExtractionCache()
@@ -0,0 +1,82 @@
+# app/services/fact_gate.py
+import re
+import threading
+from typing import Any, Dict
+
+from app.config import FACT_GATE_ENABLED, FACT_GATE_THRESHOLD
+
+# Statements about oneself are where student facts come from
+SELF_REFERENCE = re.compile(r"\b(i|i'm|im|i've|i'd|i'll|me|my|mine|myself)\b")
+SELF_DISCLOSURE = re.compile(
+    r"\b(i am|i'm|im|i was|i have|i've|i want|i'd like|i plan|i hope|i need|i like|i love|i hate|"
+    r"i prefer|i enjoy|i struggle|i work|i study|i studied|i'm studying|i'm taking|i took|i failed|"
+    r"i passed|i got|i feel|i decided|i'm interested|i'm planning|my goal|my major|my dream)\b"
+)
+# Topics the fact categories (academic, career, personal) are about
+TOPIC_WORDS = re.compile(
+    r"\b(major|minor|degree|course|courses|class|classes|exam|exams|grade|grades|gpa|semester|"
+    r"year|thesis|project|professor|university|college|program|study|studying|subject|"
+    r"career|job|jobs|internship|intern|work|working|company|industry|skill|skills|goal|goals|"
+    r"interview|resume|cv|graduate|graduation|masters|phd|research|"
+    r"stress|stressed|anxious|anxiety|tired|burnout|sleep|family|health|hobby|hobbies|schedule)\b"
+)
+NUMBER = re.compile(r"\b\d+(\.\d+)?\b")
+# Replies that carry nothing to extract
+ACKNOWLEDGEMENT = re.compile(
+    r"^(ok|okay|k|thanks|thank you|thx|ty|cool|great|nice|got it|sure|yes|no|yep|nope|"
+    r"alright|hmm+|lol|bye|hi|hello|hey)[\s.!?]*$"
+)
+
+class FactGate:
+    """Cheap heuristic deciding whether a turn is worth an extraction call.
+    
+    Only the student's message is scored: facts are about the student, and
+    the mentor's reply rarely adds any the student did not state.
+    """
+    
+    def __init__(self, threshold: float = FACT_GATE_THRESHOLD, enabled: bool = FACT_GATE_ENABLED):
+        self.threshold = threshold
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.evaluated = 0
+        self.skipped = 0
+    
+    def score(self, message: str) -> float:
+        """Likelihood-like score that a message reveals something about the student"""
+        text = message.strip().lower()
+        if not text or ACKNOWLEDGEMENT.match(text):
+            return 0.0
+        
+        score = 0.0
+        score += 1.0 * min(len(SELF_DISCLOSURE.findall(text)), 3)
+        score += 0.25 * min(len(SELF_REFERENCE.findall(text)), 4)
+        score += 0.5 * min(len(TOPIC_WORDS.findall(text)), 4)
+        score += 0.25 * min(len(NUMBER.findall(text)), 2)
+        # Longer messages tend to carry more context
+        score += min(len(text.split()) / 40, 0.5)
+        return score
+    
+    def should_extract(self, message: str) -> bool:
+        """Whether to run fact extraction for a turn, counted in the stats"""
+        if not self.enabled:
+            return True
+        extract = self.score(message) >= self.threshold
+        with self._lock:
+            self.evaluated += 1
+            if not extract:
+                self.skipped += 1
+        return extract
+    
+    def stats(self) -> Dict[str, Any]:
+        """Gate counters and configuration"""
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "threshold": self.threshold,
+                "evaluated": self.evaluated,
+                "skipped": self.skipped,
+                "skip_rate": self.skipped / self.evaluated if self.evaluated else 0.0
+            }
+
+# Shared so the stats cover every turn handled by the process
+fact_gate = FactGate()
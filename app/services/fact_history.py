@@ -0,0 +1,132 @@
+# app/services/fact_history.py
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from pymongo import ASCENDING, UpdateOne
+
+from app.config import FACT_HISTORY_MAX_CHANGES
+from app.services.database import get_sync_database
+
+# One document per (student_id, category, key):
+#   value, confidence, status     current state of the fact
+#   version                       number of recorded changes
+#   confirmations                 times the fact was restated unchanged
+#   first_seen, last_updated, last_confirmed
+#   changes                       the last FACT_HISTORY_MAX_CHANGES changes
+#                                 as {value, confidence, status, at}
+FACT_HISTORY_COLLECTION = "fact_history"
+# Append-only log written by earlier versions, one document per extraction
+LEGACY_FACTS_COLLECTION = "facts"
+
+def fact_filter(student_id: Any, category: str, key: str) -> Dict[str, Any]:
+    return {"student_id": student_id, "category": category.lower(), "key": key}
+
+def fact_change(student_id: Any, category: str, key: str, value: Any,
+                confidence: float, status: str, at: datetime) -> UpdateOne:
+    """Upsert recording a new value of a fact"""
+    return UpdateOne(
+        fact_filter(student_id, category, key),
+        {
+            "$set": {"value": value, "confidence": confidence, "status": status, "last_updated": at},
+            "$setOnInsert": {"first_seen": at, "confirmations": 0},
+            "$inc": {"version": 1},
+            "$push": {"changes": {
+                "$each": [{"value": value, "confidence": confidence, "status": status, "at": at}],
+                "$slice": -FACT_HISTORY_MAX_CHANGES
+            }}
+        },
+        upsert=True
+    )
+
+def fact_confirmation(student_id: Any, category: str, key: str, value: Any,
+                      confidence: float, status: str, at: datetime) -> UpdateOne:
+    """Upsert counting a restatement of a fact's current value"""
+    return UpdateOne(
+        fact_filter(student_id, category, key),
+        {
+            "$inc": {"confirmations": 1},
+            "$set": {"last_confirmed": at},
+            # A confirmation of a fact not recorded yet still records its value
+            "$setOnInsert": {
+                "value": value, "confidence": confidence, "status": status,
+                "first_seen": at, "last_updated": at, "version": 1,
+                "changes": [{"value": value, "confidence": confidence, "status": status, "at": at}]
+            }
+        },
+        upsert=True
+    )
+
+def _compact_student(records: List[Dict[str, Any]]) -> List[UpdateOne]:
+    """Fold one student's legacy log (oldest first) into fact_history upserts"""
+    folded: Dict[tuple, Dict[str, Any]] = {}
+    for record in records:
+        category = str(record.get("category", "")).lower()
+        fact_key = (category, record.get("key"))
+        at = record.get("extracted_at") or datetime.now()
+        entry = folded.setdefault(fact_key, {"changes": [], "confirmations": 0, "first_seen": at, "last": None})
+        change = {
+            "value": record.get("value"),
+            "confidence": record.get("confidence", 1.0),
+            "status": record.get("status"),
+            "at": at
+        }
+        if entry["last"] is not None and entry["last"]["value"] == change["value"]:
+            entry["confirmations"] += 1
+            entry["last_confirmed"] = at
+        else:
+            entry["changes"].append(change)
+        entry["last"] = change
+    
+    operations = []
+    for (category, key), entry in folded.items():
+        last_change = entry["changes"][-1]
+        update: Dict[str, Any] = {
+            # Existing records are newer than the legacy log, so their current
+            # value wins and the legacy changes go before theirs
+            "$setOnInsert": {
+                "value": last_change["value"],
+                "confidence": last_change["confidence"],
+                "status": last_change["status"],
+                "last_updated": last_change["at"]
+            },
+            "$min": {"first_seen": entry["first_seen"]},
+            "$inc": {"version": len(entry["changes"]), "confirmations": entry["confirmations"]},
+            "$push": {"changes": {
+                "$each": entry["changes"][-FACT_HISTORY_MAX_CHANGES:],
+                "$position": 0,
+                "$slice": -FACT_HISTORY_MAX_CHANGES
+            }}
+        }
+        if "last_confirmed" in entry:
+            update["$max"] = {"last_confirmed": entry["last_confirmed"]}
+        operations.append(UpdateOne({"student_id": records[0]["student_id"], "category": category, "key": key},
+                                    update, upsert=True))
+    return operations
+
+def compact_legacy_facts(db=None, limit: Optional[int] = None) -> Dict[str, int]:
+    """Move the legacy facts log into fact_history, one student at a time.
+    
+    Each student's records are merged and then deleted, so the compaction can
+    be interrupted and resumed; limit caps the number of students per run.
+    """
+    db = db if db is not None else get_sync_database()
+    legacy = db[LEGACY_FACTS_COLLECTION]
+    history = db[FACT_HISTORY_COLLECTION]
+    stats = {"students": 0, "records": 0, "facts": 0}
+    
+    for student_id in legacy.distinct("student_id"):
+        if limit is not None and stats["students"] >= limit:
+            break
+        records = list(legacy.find({"student_id": student_id}).sort("extracted_at", ASCENDING))
+        if not records:
+            continue
+        operations = _compact_student(records)
+        if operations:
+            history.bulk_write(operations, ordered=False)
+        legacy.delete_many({"_id": {"$in": [record["_id"] for record in records]}})
+        
+        stats["students"] += 1
+        stats["records"] += len(records)
+        stats["facts"] += len(operations)
+    
+    return stats
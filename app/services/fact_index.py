@@ -0,0 +1,101 @@
+# app/services/fact_index.py
+import re
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Hashable, List, Set
+
+from app.config import EXTRACTION_MAX_FACTS
+
+# Words that carry no topic on their own
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "but", "by", "can", "do", "for",
+    "from", "have", "how", "i", "in", "is", "it", "its", "me", "my", "of", "on",
+    "or", "so", "that", "the", "this", "to", "was", "we", "what", "with", "you",
+    "your", "not", "will", "would", "about", "im", "am", "just", "like", "get"
+}
+# A hit on the fact key counts more than one on its value
+KEY_WEIGHT = 2.0
+VALUE_WEIGHT = 1.0
+# Extra score when the turns name the fact's category
+CATEGORY_WEIGHT = 0.5
+
+def keywords(text: str) -> Set[str]:
+    """Lower-cased content words of a text, with a plural 's' removed"""
+    words = set()
+    for word in re.findall(r"[a-z0-9]+", text.lower()):
+        if word in STOPWORDS or len(word) < 2:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        words.add(word)
+    return words
+
+def fact_value(fact: Any) -> Any:
+    """Value of a stored fact ({value, last_updated, confidence}) or a plain value"""
+    return fact.get("value", fact) if isinstance(fact, dict) else fact
+
+class FactIndex:
+    """Keyword index over a student's facts, used to pick the relevant ones"""
+    
+    def __init__(self, facts: Dict[str, Dict[str, Any]]):
+        self.entries: List[Dict[str, Any]] = []
+        for category, category_facts in (facts or {}).items():
+            for key, fact in (category_facts or {}).items():
+                value = fact_value(fact)
+                self.entries.append({
+                    "category": category,
+                    "key": key,
+                    "value": value,
+                    "last_updated": fact.get("last_updated") if isinstance(fact, dict) else None,
+                    "key_words": keywords(key.replace("_", " ")),
+                    "value_words": keywords(str(value))
+                })
+    
+    def __len__(self) -> int:
+        return len(self.entries)
+    
+    def select(self, text: str, limit: int = EXTRACTION_MAX_FACTS) -> Dict[str, Dict[str, Any]]:
+        """Facts sharing words with the text, best matches first, at most limit of them"""
+        words = keywords(text)
+        scored = []
+        for entry in self.entries:
+            score = (KEY_WEIGHT * len(entry["key_words"] & words)
+                     + VALUE_WEIGHT * len(entry["value_words"] & words))
+            if score == 0:
+                continue
+            if entry["category"] in words:
+                score += CATEGORY_WEIGHT
+            # Recently updated facts win ties
+            scored.append((score, entry["last_updated"] or datetime.min, entry))
+        scored.sort(key=lambda item: (item[0], item[1]), reverse=True)
+        
+        selected: Dict[str, Dict[str, Any]] = {}
+        for _, _, entry in scored[:limit]:
+            selected.setdefault(entry["category"], {})[entry["key"]] = entry["value"]
+        return selected
+
+class FactIndexCache:
+    """Fact indexes reused while a student's facts are unchanged"""
+    
+    def __init__(self, max_size: int = 1000):
+        self.max_size = max_size
+        self._indexes: "OrderedDict[Hashable, FactIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, student: Dict[str, Any]) -> FactIndex:
+        """Index of the student's facts, keyed by ID and facts_version"""
+        key = (str(student.get("_id")), student.get("facts_version", 0))
+        with self._lock:
+            index = self._indexes.get(key)
+            if index is not None:
+                self._indexes.move_to_end(key)
+                return index
+        index = FactIndex(student.get("facts", {}))
+        with self._lock:
+            self._indexes[key] = index
+            while len(self._indexes) > self.max_size:
+                self._indexes.popitem(last=False)
+        return index
+
+fact_indexes = FactIndexCache()
@@ -0,0 +1,133 @@
+# app/services/history.py
+import json
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING
+from pymongo.asynchronous.collection import AsyncCollection
+from pymongo.collection import Collection
+
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import BaseMessage, message_to_dict, messages_from_dict
+
+from app.services.database import get_sync_client
+
+# Field names match langchain_mongodb's MongoDBChatMessageHistory so existing
+# conversations stored by it stay readable
+SESSION_ID_KEY = "SessionId"
+HISTORY_KEY = "History"
+
+class AsyncMongoDBChatMessageHistory(BaseChatMessageHistory):
+    """Chat message history stored in MongoDB, accessed through the async driver (sync access blocks)"""
+
+    def __init__(self, collection: AsyncCollection, session_id: str):
+        self.collection = collection
+        self.session_id = session_id
+
+    # The synchronous interface (used e.g. by LangChain runnables invoked
+    # synchronously) goes through the shared sync client. It blocks, so async
+    # code should use the a* methods instead.
+    
+    @property
+    def sync_collection(self) -> Collection:
+        """The same collection on the shared synchronous client"""
+        return get_sync_client()[self.collection.database.name][self.collection.name]
+
+    @property
+    def messages(self) -> List[BaseMessage]:
+        """Retrieve all messages of the session in insertion order"""
+        cursor = self.sync_collection.find({SESSION_ID_KEY: self.session_id}).sort("_id", ASCENDING)
+        return self._to_messages(list(cursor))
+
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
+        """Append messages to the session in a single round trip"""
+        if not messages:
+            return
+        self.sync_collection.insert_many(self._to_documents(messages))
+
+    def clear(self) -> None:
+        """Remove all messages of the session"""
+        self.sync_collection.delete_many({SESSION_ID_KEY: self.session_id})
+
+    async def aget_messages(self) -> List[BaseMessage]:
+        """Retrieve all messages of the session in insertion order"""
+        cursor = self.collection.find({SESSION_ID_KEY: self.session_id}).sort("_id", ASCENDING)
+        return self._to_messages([document async for document in cursor])
+    
+    async def acount(self) -> int:
+        """Count the messages of the session without loading them"""
+        return await self.collection.count_documents({SESSION_ID_KEY: self.session_id})
+    
+    async def aget_head(self, limit: int) -> List[BaseMessage]:
+        """Retrieve the first messages of the session"""
+        cursor = (
+            self.collection.find({SESSION_ID_KEY: self.session_id})
+            .sort("_id", ASCENDING)
+            .limit(limit)
+        )
+        return self._to_messages([document async for document in cursor])
+    
+    async def aget_tail(self, limit: int, before: Optional[Union[str, ObjectId]] = None) -> List[BaseMessage]:
+        """Retrieve the last messages of the session, optionally only those older than a message ID"""
+        query: Dict[str, Any] = {SESSION_ID_KEY: self.session_id}
+        if before is not None:
+            query["_id"] = {"$lt": ObjectId(before)}
+        cursor = (
+            self.collection.find(query)
+            .sort("_id", DESCENDING)
+            .limit(limit)
+        )
+        documents = [document async for document in cursor]
+        documents.reverse()
+        return self._to_messages(documents)
+    
+    async def aget_range(self,
+                         after: Optional[Union[str, ObjectId]] = None,
+                         before: Optional[Union[str, ObjectId]] = None,
+                         limit: int = 0) -> List[BaseMessage]:
+        """Retrieve messages between two message IDs (both exclusive) in insertion order"""
+        query: Dict[str, Any] = {SESSION_ID_KEY: self.session_id}
+        id_range = {}
+        if after is not None:
+            id_range["$gt"] = ObjectId(after)
+        if before is not None:
+            id_range["$lt"] = ObjectId(before)
+        if id_range:
+            query["_id"] = id_range
+        cursor = self.collection.find(query).sort("_id", ASCENDING).limit(limit)
+        return self._to_messages([document async for document in cursor])
+    
+    @staticmethod
+    def _to_messages(documents: List[Dict[str, Any]]) -> List[BaseMessage]:
+        """Deserialize stored documents, using the document ID as message ID (a paging cursor)"""
+        messages = messages_from_dict([json.loads(document[HISTORY_KEY]) for document in documents])
+        for message, document in zip(messages, documents):
+            message.id = str(document["_id"])
+        return messages
+
+    def _to_documents(self, messages: Sequence[BaseMessage]) -> List[Dict[str, Any]]:
+        return [
+            {
+                SESSION_ID_KEY: self.session_id,
+                HISTORY_KEY: json.dumps(message_to_dict(message))
+            } for message in messages
+        ]
+
+    async def aadd_messages(self, messages: Sequence[BaseMessage]) -> List[str]:
+        """Append messages to the session in a single round trip; returns their IDs"""
+        if not messages:
+            return []
+        result = await self.collection.insert_many(self._to_documents(messages))
+        return [str(inserted_id) for inserted_id in result.inserted_ids]
+
+    async def adelete_messages(self, message_ids: Sequence[Union[str, ObjectId]]) -> None:
+        """Remove specific messages of the session"""
+        if message_ids:
+            await self.collection.delete_many({
+                SESSION_ID_KEY: self.session_id,
+                "_id": {"$in": [ObjectId(message_id) for message_id in message_ids]}
+            })
+
+    async def aclear(self) -> None:
+        """Remove all messages of the session"""
+        await self.collection.delete_many({SESSION_ID_KEY: self.session_id})
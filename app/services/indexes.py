@@ -0,0 +1,125 @@
+# app/services/indexes.py
+from typing import Dict, List, Any
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+from app.config import JOB_FAILED_TTL_SECONDS, EXTRACTION_CACHE_TTL_SECONDS
+from app.services.database import get_sync_database
+from app.services.history import SESSION_ID_KEY
+
+# Indexes backing the hot lookups, declared per collection. Creation is
+# idempotent, so this can run on every startup.
+INDEXES: Dict[str, List[IndexModel]] = {
+    "students": [
+        # Login looks students up by email
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+    ],
+    "conversations": [
+        # get_or_create_student_conversation / get_recent_conversations
+        IndexModel(
+            [("student_id", ASCENDING), ("updated_at", DESCENDING)],
+            name="student_updated_at",
+            partialFilterExpression={"student_id": {"$exists": True}}
+        ),
+        # Message history documents share this collection, keyed by session id
+        # and read in insertion order
+        IndexModel(
+            [(SESSION_ID_KEY, ASCENDING), ("_id", ASCENDING)],
+            name="session_messages",
+            partialFilterExpression={SESSION_ID_KEY: {"$exists": True}}
+        ),
+    ],
+    "fact_history": [
+        # One record per fact, updated in place
+        IndexModel(
+            [("student_id", ASCENDING), ("category", ASCENDING), ("key", ASCENDING)],
+            name="student_category_key_unique",
+            unique=True
+        ),
+    ],
+    "facts": [
+        # Legacy log, read per student while compact_legacy_facts drains it
+        IndexModel([("student_id", ASCENDING), ("extracted_at", DESCENDING)], name="student_extracted_at"),
+    ],
+    "extraction_cache": [
+        # Cached extraction results expire instead of accumulating
+        IndexModel([("created_at", ASCENDING)], name="created_at_ttl",
+                   expireAfterSeconds=EXTRACTION_CACHE_TTL_SECONDS),
+    ],
+    "message_embeddings": [
+        # Re-indexing a message is a no-op
+        IndexModel([("student_id", ASCENDING), ("message_id", ASCENDING)], name="student_message_unique", unique=True),
+        # Loading and refreshing a student's vectors
+        IndexModel([("student_id", ASCENDING), ("model", ASCENDING), ("_id", ASCENDING)], name="student_model_id"),
+    ],
+    "sessions": [
+        # API sessions are removed once they expire
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    "llm_slots": [
+        # Shared LLM slots are leased per endpoint, lowest or highest index first
+        IndexModel([("endpoint", ASCENDING), ("index", ASCENDING)], name="endpoint_index"),
+    ],
+    "jobs": [
+        # At most one pending job per (kind, key), which is what makes coalescing work
+        IndexModel(
+            [("kind", ASCENDING), ("key", ASCENDING)],
+            name="pending_kind_key_unique",
+            unique=True,
+            partialFilterExpression={"status": "pending"}
+        ),
+        # Claiming the next job
+        IndexModel([("status", ASCENDING), ("available_at", ASCENDING)], name="status_available_at"),
+        # Failed jobs are kept for a while, then removed
+        IndexModel(
+            [("updated_at", ASCENDING)],
+            name="failed_ttl",
+            expireAfterSeconds=JOB_FAILED_TTL_SECONDS,
+            partialFilterExpression={"status": "failed"}
+        ),
+    ],
+}
+
+def ensure_indexes(db=None) -> Dict[str, Any]:
+    """Create any declared index that does not exist yet"""
+    db = db if db is not None else get_sync_database()
+    created = {}
+    errors = {}
+    
+    for collection_name, indexes in INDEXES.items():
+        try:
+            created[collection_name] = db[collection_name].create_indexes(indexes)
+        except OperationFailure as e:
+            # e.g. duplicate emails blocking the unique index, or an existing
+            # index with the same keys under a different name
+            errors[collection_name] = str(e)
+    
+    return {"created": created, "errors": errors}
+
+def check_indexes(db=None) -> Dict[str, Dict[str, List[str]]]:
+    """Report missing, unmanaged and unused indexes for each declared collection"""
+    db = db if db is not None else get_sync_database()
+    report = {}
+    
+    for collection_name, indexes in INDEXES.items():
+        collection = db[collection_name]
+        declared = {index.document["name"] for index in indexes}
+        existing = set(collection.index_information().keys()) - {"_id_"}
+        
+        # Indexes that have served no operation since the server started
+        unused = []
+        try:
+            for stats in collection.aggregate([{"$indexStats": {}}]):
+                if stats["name"] != "_id_" and stats["accesses"]["ops"] == 0:
+                    unused.append(stats["name"])
+        except OperationFailure:
+            pass
+        
+        report[collection_name] = {
+            "missing": sorted(declared - existing),
+            "unmanaged": sorted(existing - declared),
+            "unused": sorted(unused),
+        }
+    
+    return report
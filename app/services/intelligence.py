@@ -8,9 +8,16 @@ from langchain_core.prompts import PromptTemplate, ChatPromptTemplate
 from langchain_core.output_parsers import PydanticOutputParser
 from pydantic import BaseModel, Field  # Use Pydantic v2 directly
 
+from app.config import EXTRACTION_NUM_CTX, EXTRACTION_NUM_PREDICT, EXTRACTION_MAX_FACTS, EXTRACTION_FACTS_MAX_TOKENS
 from app.models.conversation import FactExtractionResult, ExtractedFact, Contradiction
 from app.services.memory import MemoryService
-from app.config import OLLAMA_BASE_URL, OLLAMA_MODEL
+from app.services.context import CHARS_PER_TOKEN, estimate_tokens
+from app.services.fact_index import fact_indexes
+from app.services.extraction_cache import extraction_cache, extraction_cache_key
+from app.services.telemetry import telemetry
+from app.services.llm import MODEL_ROUTES, EXTRACTION_TASK, get_task_llm, get_task_chain
+from app.services.scheduler import llm_slot
+from app.utils.prompts import FACT_EXTRACTION_PROMPT, FACT_EXTRACTION_PROMPT_VERSION
 
 # Define Pydantic models for the parser
 class FactSchema(BaseModel):
@@ -29,10 +36,30 @@ class FactOutputSchema(BaseModel):
     extracted_facts: List[FactSchema] = Field(description="List of extracted facts", default_factory=list)
     contradictions: List[ContradictionSchema] = Field(description="List of contradictions found", default_factory=list)
 
+# Parser and prompt are stateless, so build them once
+FACT_PARSER = PydanticOutputParser(pydantic_object=FactOutputSchema)
+FACT_PROMPT = PromptTemplate(
+    template=FACT_EXTRACTION_PROMPT,
+    input_variables=["conversation", "existing_facts"],
+    partial_variables={"format_instructions": FACT_PARSER.get_format_instructions()}
+)
+# Room left for the turns of one extraction call once the template, the
+# existing facts and the reply are accounted for
+TURNS_BUDGET_TOKENS = max(1, EXTRACTION_NUM_CTX - EXTRACTION_NUM_PREDICT - EXTRACTION_FACTS_MAX_TOKENS
+                          - estimate_tokens(FACT_PROMPT.format(conversation="", existing_facts="")))
+
 class IntelligenceService:
-    def __init__(self):
-        self.memory_service = MemoryService()
-        self.llm = OllamaLLM(base_url=OLLAMA_BASE_URL, model=OLLAMA_MODEL, temperature=0.2)
+    def __init__(self, memory_service: Optional[MemoryService] = None):
+        self.memory_service = memory_service or MemoryService()
+    
+    @property
+    def llm(self) -> OllamaLLM:
+        """Shared LLM client used for fact extraction"""
+        return get_task_llm(EXTRACTION_TASK)
+    
+    def _get_extraction_chain(self):
+        """Get the compiled fact extraction chain"""
+        return get_task_chain(EXTRACTION_TASK, lambda llm: FACT_PROMPT | llm | FACT_PARSER)
     
     async def extract_facts(self, 
                           student_id: str, 
@@ -40,80 +67,142 @@ class IntelligenceService:
                           message: str, 
                           response: str) -> FactExtractionResult:
         """Extract facts from a conversation using modern approach"""
-        # Get existing student facts
-        existing_facts = await self.memory_service.get_student_facts(student_id)
-        
-        # Set up the output parser
-        parser = PydanticOutputParser(pydantic_object=FactOutputSchema)
-        
-        # Create fact extraction prompt
-        fact_template = """
-        You are an AI assistant specialized in extracting structured facts about students from conversations.
-        
-        Based on the following conversation excerpt:
-        
-        USER: {user_message}
-        ASSISTANT: {assistant_response}
-        
-        Please extract any facts about the student, considering these existing facts:
-        {existing_facts}
-        
-        Extract facts in these categories:
-        1. ACADEMIC: courses, study habits, academic performance, interests, challenges
-        2. CAREER: goals, interests, skills, experiences, plans
-        3. PERSONAL: preferences, challenges, support needs, wellbeing status
-        
-        For each fact, indicate if it's NEW, UPDATED, or a CONFIRMATION of existing information.
-        
-        {format_instructions}
-        
-        Include only definite facts, not speculations.
-        """
-        
         try:
-            # Create the prompt
-            prompt = PromptTemplate(
-                template=fact_template,
-                input_variables=["user_message", "assistant_response", "existing_facts"],
-                partial_variables={"format_instructions": parser.get_format_instructions()}
-            )
-            
-            # Create the chain using LCEL
-            chain = prompt | self.llm | parser
+            return await self.extract_facts_from_turns(student_id, [{"message": message, "response": response}])
+        except Exception as e:
+            telemetry.error("extraction.failed", e, student_id=student_id)
+            # Return empty result on error
+            return FactExtractionResult()
+    
+    async def run_extraction_job(self, job: Dict[str, Any]) -> None:
+        """Job handler: extract facts from all turns queued for a student, in as few LLM calls as fit"""
+        await self.extract_facts_from_turns(job["key"], job["items"])
+    
+    async def extract_facts_from_turns(self, student_id: str, turns: List[Dict[str, Any]]) -> FactExtractionResult:
+        """Extract facts from one or more (message, response) turns; errors are raised"""
+        try:
+            with telemetry.span("extraction.run"):
+                return await self._extract_facts_from_turns(student_id, turns)
+        except Exception:
+            telemetry.incr("extraction_runs_total", result="failed")
+            raise
+    
+    async def _extract_facts_from_turns(self, student_id: str, turns: List[Dict[str, Any]]) -> FactExtractionResult:
+        # Ollama silently drops what exceeds num_ctx, so turns that don't fit
+        # one prompt go to several calls, each seeing the facts of the last
+        batches = self._batch_turns(turns)
+        if len(batches) > 1:
+            telemetry.log("extraction.turns_split", turns=len(turns), calls=len(batches))
+        result = FactExtractionResult()
+        for batch in batches:
+            batch_result = await self._extract_batch(student_id, batch)
+            result.extracted_facts.extend(batch_result.extracted_facts)
+            result.contradictions.extend(batch_result.contradictions)
+        return result
+    
+    async def _extract_batch(self, student_id: str, turns: List[Dict[str, Any]]) -> FactExtractionResult:
+        # Only the existing facts related to these turns, not the whole profile
+        conversation = self._format_turns(turns)
+        student = await self.memory_service.get_student(student_id)
+        existing_facts = self._select_facts(student, conversation) if student else {}
+        
+        # Identical inputs (retries, reprocessing, duplicate submissions) reuse the earlier result
+        model = MODEL_ROUTES[EXTRACTION_TASK].model
+        cache_key = extraction_cache_key(conversation, existing_facts, model, FACT_EXTRACTION_PROMPT_VERSION)
+        cached = await extraction_cache.get(cache_key)
+        if cached is not None:
+            telemetry.incr("extraction_runs_total", result="cached")
+            result = FactOutputSchema.model_validate(cached)
+        else:
+            # Get the precompiled extraction chain
+            chain = self._get_extraction_chain()
             
             # Run the chain
-            result = await chain.ainvoke({
-                "user_message": message,
-                "assistant_response": response,
-                "existing_facts": json.dumps(existing_facts, default=str)
-            })
-            
-            # Convert to our application's model
-            fact_result = FactExtractionResult(
-                extracted_facts=[
-                    ExtractedFact(
-                        category=fact.category,
-                        key=fact.key,
-                        value=fact.value,
-                        status=fact.status,
-                        confidence=fact.confidence
-                    ) for fact in result.extracted_facts
-                ],
-                contradictions=[
-                    Contradiction(
-                        existing=contradiction.existing,
-                        new_information=contradiction.new_information,
-                        resolution=contradiction.resolution
-                    ) for contradiction in result.contradictions
-                ]
+            async with llm_slot(EXTRACTION_TASK):
+                with telemetry.span("extraction.llm"):
+                    result = await chain.ainvoke({
+                        "conversation": conversation,
+                        "existing_facts": json.dumps(existing_facts, default=str)
+                    })
+            telemetry.incr("extraction_runs_total", result="ok")
+            await extraction_cache.set(
+                cache_key, result.model_dump(),
+                model=model, prompt_version=FACT_EXTRACTION_PROMPT_VERSION
             )
-            
-            # Update student facts in database
+        
+        # Convert to our application's model
+        fact_result = FactExtractionResult(
+            extracted_facts=[
+                ExtractedFact(
+                    category=fact.category,
+                    key=fact.key,
+                    value=fact.value,
+                    status=fact.status,
+                    confidence=fact.confidence
+                ) for fact in result.extracted_facts
+            ],
+            contradictions=[
+                Contradiction(
+                    existing=contradiction.existing,
+                    new_information=contradiction.new_information,
+                    resolution=contradiction.resolution
+                ) for contradiction in result.contradictions
+            ]
+        )
+        
+        # Update student facts in database
+        with telemetry.span("extraction.persist"):
             await self.memory_service.update_student_facts(student_id, fact_result)
-            
-            return fact_result
-            
-        except Exception as e:
-            print(f"Error extracting facts: {e}")
-            # Return empty result on error
-            return FactExtractionResult()
\ No newline at end of file
+        
+        return fact_result
+    
+    def _select_facts(self, student: Dict[str, Any], conversation: str) -> Dict[str, Dict[str, Any]]:
+        """The most relevant facts, as many as fit EXTRACTION_FACTS_MAX_TOKENS"""
+        index = fact_indexes.get(student)
+        limit = EXTRACTION_MAX_FACTS
+        facts = index.select(conversation, limit)
+        while limit > 0 and estimate_tokens(json.dumps(facts, default=str)) > EXTRACTION_FACTS_MAX_TOKENS:
+            limit -= 1
+            facts = index.select(conversation, limit)
+        return facts
+    
+    def _batch_turns(self, turns: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        """Group consecutive turns so each group's excerpt fits TURNS_BUDGET_TOKENS"""
+        batches: List[List[Dict[str, Any]]] = []
+        batch: List[Dict[str, Any]] = []
+        used = 0
+        for turn in turns:
+            turn = self._fit_turn(turn)
+            # +1 for the blank line between turns
+            tokens = estimate_tokens(self._format_turns([turn])) + 1
+            if batch and used + tokens > TURNS_BUDGET_TOKENS:
+                batches.append(batch)
+                batch, used = [], 0
+            batch.append(turn)
+            used += tokens
+        if batch:
+            batches.append(batch)
+        return batches
+    
+    def _fit_turn(self, turn: Dict[str, Any]) -> Dict[str, Any]:
+        """The turn cut down to fit one call on its own: the mentor's reply is
+        trimmed first, since the facts come from the student's message"""
+        excess = estimate_tokens(self._format_turns([turn])) + 1 - TURNS_BUDGET_TOKENS
+        if excess <= 0:
+            return turn
+        turn = dict(turn)
+        for field in ("response", "message"):
+            text = turn[field]
+            cut = min(len(text), (excess + 1) * CHARS_PER_TOKEN + len("..."))
+            if cut:
+                turn[field] = text[:len(text) - cut] + "..."
+                excess -= estimate_tokens(text) - estimate_tokens(turn[field])
+            if excess <= 0:
+                break
+        return turn
+    
+    def _format_turns(self, turns: List[Dict[str, Any]]) -> str:
+        """Render turns as the USER/ASSISTANT excerpt used in the prompt"""
+        return "\n\n".join(
+            f"USER: {turn['message']}\nASSISTANT: {turn['response']}" for turn in turns
+        )
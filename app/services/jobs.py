@@ -0,0 +1,281 @@
+# app/services/jobs.py
+import asyncio
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from app.config import (
+    JOB_QUEUE_MAX_PENDING, JOB_MAX_ITEMS, JOB_MAX_ATTEMPTS,
+    JOB_RETRY_BACKOFF_SECONDS, JOB_LEASE_SECONDS, JOB_POLL_INTERVAL_SECONDS
+)
+from app.services.database import get_async_database
+from app.services.telemetry import telemetry
+
+# Job states. Finished jobs are deleted; jobs that ran out of attempts stay
+# as "failed" for inspection until the TTL index removes them.
+PENDING = "pending"
+RUNNING = "running"
+FAILED = "failed"
+
+# Job kinds
+FACT_EXTRACTION = "fact_extraction"
+CONVERSATION_SUMMARY = "conversation_summary"
+MESSAGE_EMBEDDING = "message_embedding"
+
+class JobQueue:
+    """Durable, bounded job queue stored in MongoDB.
+    
+    There is at most one pending job per (kind, key); enqueueing more work for
+    the same key appends an item to that job, so a worker handles several
+    queued turns of one student in a single run.
+    """
+    
+    def __init__(self, collection_name: str = "jobs", lease_seconds: float = JOB_LEASE_SECONDS):
+        self.collection_name = collection_name
+        self.lease_seconds = lease_seconds
+    
+    @property
+    def jobs(self):
+        return get_async_database()[self.collection_name]
+    
+    async def _append_items(self, kind: str, key: str, items: List[Dict[str, Any]], now: datetime,
+                            max_items: Optional[int] = JOB_MAX_ITEMS, position: Optional[int] = None) -> bool:
+        """Push items onto the pending job for (kind, key), keeping the newest
+        max_items (all if None); returns False if there is no pending job"""
+        push: Dict[str, Any] = {"$each": items}
+        if max_items is not None:
+            push["$slice"] = -max_items
+        if position is not None:
+            push["$position"] = position
+        before = await self.jobs.find_one_and_update(
+            {"kind": kind, "key": key, "status": PENDING},
+            {"$push": {"items": push}, "$set": {"updated_at": now}},
+            projection={"item_count": {"$size": "$items"}}
+        )
+        if before is None:
+            return False
+        dropped = before["item_count"] + len(items) - max_items if max_items is not None else 0
+        if dropped > 0:
+            telemetry.incr("jobs_total", dropped, kind=kind, result="dropped", reason="trimmed")
+            telemetry.log("jobs.items_trimmed", level="warning", kind=kind, key=key, dropped=dropped)
+        return True
+    
+    async def enqueue(self, kind: str, key: str, item: Dict[str, Any],
+                      max_items: Optional[int] = JOB_MAX_ITEMS) -> bool:
+        """Add an item to the pending job for (kind, key), creating it if needed.
+        
+        The job keeps the newest max_items items. Pass None for jobs that must
+        see every item; their handler is then responsible for batching.
+        """
+        now = datetime.now(timezone.utc)
+        item = {**item, "enqueued_at": now}
+        
+        for _ in range(2):
+            # Coalesce into the existing pending job
+            if await self._append_items(kind, key, [item], now, max_items):
+                return True
+            
+            # Keep the queue bounded
+            if await self.jobs.count_documents({"status": PENDING}) >= JOB_QUEUE_MAX_PENDING:
+                telemetry.incr("jobs_total", kind=kind, result="dropped", reason="queue_full")
+                telemetry.log("jobs.queue_full", level="warning", kind=kind, key=key)
+                return False
+            
+            try:
+                await self.jobs.insert_one({
+                    "kind": kind,
+                    "key": key,
+                    "status": PENDING,
+                    "items": [item],
+                    "max_items": max_items,
+                    "attempts": 0,
+                    "available_at": now,
+                    "created_at": now,
+                    "updated_at": now
+                })
+                return True
+            except DuplicateKeyError:
+                # Another process created the pending job first, append to it
+                continue
+        
+        return False
+    
+    async def claim(self, kinds: List[str]) -> Optional[Dict[str, Any]]:
+        """Lease the next available job, including running jobs whose lease expired.
+        
+        The job carries a fresh lease token; renew, complete and fail only act
+        while the job still holds it, so a worker whose lease ran out cannot
+        touch a job another worker has claimed since.
+        """
+        now = datetime.now(timezone.utc)
+        return await self.jobs.find_one_and_update(
+            {
+                "kind": {"$in": kinds},
+                "$or": [
+                    {"status": PENDING, "available_at": {"$lte": now}},
+                    {"status": RUNNING, "locked_until": {"$lt": now}}
+                ]
+            },
+            {
+                "$set": {
+                    "status": RUNNING,
+                    "lease": uuid.uuid4().hex,
+                    "locked_until": now + timedelta(seconds=self.lease_seconds),
+                    "updated_at": now
+                },
+                "$inc": {"attempts": 1}
+            },
+            sort=[("available_at", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+    
+    @staticmethod
+    def _leased(job: Dict[str, Any]) -> Dict[str, Any]:
+        """Filter matching the job only while it holds its lease"""
+        return {"_id": job["_id"], "status": RUNNING, "lease": job["lease"]}
+    
+    @staticmethod
+    def _lease_lost(job: Dict[str, Any]) -> None:
+        telemetry.incr("jobs_total", kind=job["kind"], result="lease_lost")
+        telemetry.log("jobs.lease_lost", level="warning", kind=job["kind"], key=job["key"])
+    
+    async def renew(self, job: Dict[str, Any]) -> bool:
+        """Extend the lease of a running job; False if it is no longer held"""
+        now = datetime.now(timezone.utc)
+        result = await self.jobs.update_one(
+            self._leased(job),
+            {"$set": {"locked_until": now + timedelta(seconds=self.lease_seconds), "updated_at": now}}
+        )
+        return result.matched_count > 0
+    
+    async def complete(self, job: Dict[str, Any]) -> None:
+        """Remove a finished job"""
+        result = await self.jobs.delete_one(self._leased(job))
+        if result.deleted_count == 0:
+            self._lease_lost(job)
+    
+    async def fail(self, job: Dict[str, Any], error: str) -> None:
+        """Schedule a retry with exponential backoff, or mark the job failed"""
+        now = datetime.now(timezone.utc)
+        
+        if job["attempts"] >= JOB_MAX_ATTEMPTS:
+            result = await self.jobs.update_one(
+                self._leased(job),
+                {"$set": {"status": FAILED, "lease": None, "last_error": error, "updated_at": now}}
+            )
+            if result.matched_count == 0:
+                self._lease_lost(job)
+            return
+        
+        delay = JOB_RETRY_BACKOFF_SECONDS * 2 ** (job["attempts"] - 1)
+        for _ in range(2):
+            try:
+                result = await self.jobs.update_one(
+                    self._leased(job),
+                    {"$set": {
+                        "status": PENDING,
+                        "lease": None,
+                        "available_at": now + timedelta(seconds=delay),
+                        "last_error": error,
+                        "updated_at": now
+                    }}
+                )
+                if result.matched_count == 0:
+                    self._lease_lost(job)
+                return
+            except DuplicateKeyError:
+                pass
+            # New work for the same key arrived meanwhile, fold this job into it
+            # (its items are older, so they go first)
+            if await self._append_items(job["kind"], job["key"], job["items"], now,
+                                        job.get("max_items", JOB_MAX_ITEMS), position=0):
+                await self.jobs.delete_one(self._leased(job))
+                return
+            # That job was claimed in between, so this one can become pending again
+        
+        # Still racing with new work: keep the job as it is, it is retried once its lease expires
+        telemetry.log("jobs.retry_deferred", level="warning", kind=job["kind"], key=job["key"])
+    
+    async def stats(self) -> Dict[str, int]:
+        """Number of jobs per status"""
+        counts = {PENDING: 0, RUNNING: 0, FAILED: 0}
+        async for row in await self.jobs.aggregate([{"$group": {"_id": "$status", "count": {"$sum": 1}}}]):
+            counts[row["_id"]] = row["count"]
+        return counts
+
+class JobWorker:
+    """Runs queued jobs with bounded concurrency"""
+    
+    def __init__(self,
+                 queue: JobQueue,
+                 handlers: Dict[str, Callable[[Dict[str, Any]], Awaitable[None]]],
+                 concurrency: int = 1,
+                 poll_interval: float = JOB_POLL_INTERVAL_SECONDS):
+        self.queue = queue
+        self.handlers = handlers
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+    
+    async def run(self, stop_event: Optional[asyncio.Event] = None) -> None:
+        """Process jobs until the stop event is set"""
+        stop_event = stop_event or asyncio.Event()
+        await asyncio.gather(*(self._run_slot(stop_event) for _ in range(self.concurrency)))
+    
+    async def _run_slot(self, stop_event: asyncio.Event) -> None:
+        while not stop_event.is_set():
+            try:
+                job = await self.queue.claim(list(self.handlers))
+            except Exception as e:
+                telemetry.error("jobs.claim_failed", e)
+                job = None
+            
+            if job is None:
+                # Nothing to do, wait for the next poll or the stop signal
+                try:
+                    await asyncio.wait_for(stop_event.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            
+            await self.run_job(job)
+    
+    async def _renew_lease(self, job: Dict[str, Any]) -> None:
+        """Keep the job's lease alive while its handler runs"""
+        while True:
+            await asyncio.sleep(self.queue.lease_seconds / 3)
+            try:
+                renewed = await self.queue.renew(job)
+            except Exception as e:
+                telemetry.error("jobs.renew_failed", e)
+                continue
+            if not renewed:
+                # Another worker claimed the job; complete/fail report the lost lease
+                return
+    
+    async def run_job(self, job: Dict[str, Any]) -> None:
+        """Run one claimed job and record the outcome"""
+        with telemetry.context(job_kind=job["kind"], job_key=job["key"]):
+            renewal = asyncio.create_task(self._renew_lease(job))
+            error = None
+            try:
+                with telemetry.span("job.run", kind=job["kind"]):
+                    await self.handlers[job["kind"]](job)
+            except Exception as e:
+                error = e
+            finally:
+                renewal.cancel()
+            
+            try:
+                if error is None:
+                    telemetry.incr("jobs_total", kind=job["kind"], result="ok")
+                    await self.queue.complete(job)
+                else:
+                    telemetry.incr("jobs_total", kind=job["kind"], result="failed")
+                    telemetry.error("jobs.run_failed", error, attempt=job["attempts"])
+                    await self.queue.fail(job, str(error))
+            except Exception as e:
+                # The job stays running and is claimed again once its lease expires
+                telemetry.error("jobs.record_failed", e)
@@ -0,0 +1,167 @@
+# app/services/llm.py
+import asyncio
+import threading
+import weakref
+from typing import Any, Callable, Dict, Hashable, Optional
+
+import httpx
+from ollama import AsyncClient, Client
+from pydantic import BaseModel
+from langchain_ollama import OllamaEmbeddings, OllamaLLM
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from langchain_core.runnables import Runnable
+
+from app.config import (
+    OLLAMA_BASE_URL, OLLAMA_MODEL, OLLAMA_KEEP_ALIVE,
+    OLLAMA_MAX_CONNECTIONS, OLLAMA_MAX_KEEPALIVE_CONNECTIONS,
+    MENTOR_MODEL, MENTOR_TEMPERATURE, MENTOR_CONTEXT_TOKENS, MENTOR_NUM_PREDICT,
+    EXTRACTION_MODEL, EXTRACTION_TEMPERATURE, EXTRACTION_NUM_CTX, EXTRACTION_NUM_PREDICT,
+    SUMMARY_MODEL, SUMMARY_TEMPERATURE, SUMMARY_NUM_CTX, SUMMARY_NUM_PREDICT,
+    EMBEDDING_MODEL
+)
+from app.services.telemetry import telemetry
+
+# Tasks with their own model configuration
+MENTOR_TASK = "mentor"
+EXTRACTION_TASK = "extraction"
+SUMMARY_TASK = "summary"
+EMBEDDING_TASK = "embedding"
+
+class ModelRoute(BaseModel):
+    """Model and generation options used for a task"""
+    task: str
+    model: str
+    temperature: Optional[float] = None
+    num_ctx: Optional[int] = None
+    num_predict: Optional[int] = None
+    
+    def options(self) -> Dict[str, Any]:
+        """Generation options that are set"""
+        return self.model_dump(exclude={"task", "model"}, exclude_none=True)
+
+MODEL_ROUTES: Dict[str, ModelRoute] = {
+    MENTOR_TASK: ModelRoute(task=MENTOR_TASK, model=MENTOR_MODEL, temperature=MENTOR_TEMPERATURE,
+                            num_ctx=MENTOR_CONTEXT_TOKENS, num_predict=MENTOR_NUM_PREDICT),
+    EXTRACTION_TASK: ModelRoute(task=EXTRACTION_TASK, model=EXTRACTION_MODEL, temperature=EXTRACTION_TEMPERATURE,
+                                num_ctx=EXTRACTION_NUM_CTX, num_predict=EXTRACTION_NUM_PREDICT),
+    SUMMARY_TASK: ModelRoute(task=SUMMARY_TASK, model=SUMMARY_MODEL, temperature=SUMMARY_TEMPERATURE,
+                             num_ctx=SUMMARY_NUM_CTX, num_predict=SUMMARY_NUM_PREDICT),
+    EMBEDDING_TASK: ModelRoute(task=EMBEDDING_TASK, model=EMBEDDING_MODEL),
+}
+
+class ModelUsageCallback(BaseCallbackHandler):
+    """Reports the model that served each call of a task, with its token counts"""
+    
+    def __init__(self, route: ModelRoute):
+        self.route = route
+    
+    def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+        info = {}
+        if response.generations and response.generations[0]:
+            info = response.generations[0][0].generation_info or {}
+        labels = {"task": self.route.task, "model": info.get("model") or self.route.model}
+        telemetry.incr("llm_calls_total", **labels)
+        telemetry.incr("llm_prompt_eval_tokens_total", info.get("prompt_eval_count") or 0, **labels)
+        telemetry.incr("llm_completion_tokens_total", info.get("eval_count") or 0, **labels)
+        telemetry.log("llm.call", level="debug", **labels,
+                      prompt_eval_tokens=info.get("prompt_eval_count"), completion_tokens=info.get("eval_count"))
+
+# Long-lived LLM clients and compiled chains. Async HTTP clients are bound to
+# the event loop they were first used on, so objects that hold one are kept
+# per loop; code running outside a loop shares a default registry.
+
+class _Registry:
+    def __init__(self):
+        self.http_clients: Dict[str, AsyncClient] = {}
+        self.llms: Dict[Hashable, OllamaLLM] = {}
+        self.embeddings: Dict[Hashable, OllamaEmbeddings] = {}
+        self.chains: Dict[Hashable, Runnable] = {}
+
+_loop_registries: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _Registry]" = weakref.WeakKeyDictionary()
+_default_registry = _Registry()
+_sync_http_clients: Dict[str, Client] = {}
+_lock = threading.RLock()
+
+def _registry() -> _Registry:
+    """Registry for the running event loop, or the default one"""
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return _default_registry
+    with _lock:
+        registry = _loop_registries.get(loop)
+        if registry is None:
+            registry = _loop_registries[loop] = _Registry()
+        return registry
+
+def _http_client_kwargs() -> Dict[str, Any]:
+    return {
+        "limits": httpx.Limits(
+            max_connections=OLLAMA_MAX_CONNECTIONS,
+            max_keepalive_connections=OLLAMA_MAX_KEEPALIVE_CONNECTIONS
+        )
+    }
+
+def get_http_clients(base_url: str = OLLAMA_BASE_URL):
+    """Shared (sync, async) Ollama HTTP clients for a server"""
+    registry = _registry()
+    with _lock:
+        sync_client = _sync_http_clients.get(base_url)
+        if sync_client is None:
+            sync_client = _sync_http_clients[base_url] = Client(host=base_url, **_http_client_kwargs())
+        async_client = registry.http_clients.get(base_url)
+        if async_client is None:
+            async_client = registry.http_clients[base_url] = AsyncClient(host=base_url, **_http_client_kwargs())
+    return sync_client, async_client
+
+def get_llm(model: str = OLLAMA_MODEL, base_url: str = OLLAMA_BASE_URL, **params: Any) -> OllamaLLM:
+    """Get a long-lived OllamaLLM for a model and generation parameters"""
+    registry = _registry()
+    key = (base_url, model, tuple(sorted(params.items())))
+    with _lock:
+        llm = registry.llms.get(key)
+        if llm is None:
+            llm = OllamaLLM(base_url=base_url, model=model, **params)
+            # Share one connection pool per server instead of one per instance
+            llm._client, llm._async_client = get_http_clients(base_url)
+            registry.llms[key] = llm
+        return llm
+
+def get_embeddings(model: str, base_url: str = OLLAMA_BASE_URL) -> OllamaEmbeddings:
+    """Get a long-lived OllamaEmbeddings client for a model"""
+    registry = _registry()
+    key = (base_url, model)
+    with _lock:
+        embeddings = registry.embeddings.get(key)
+        if embeddings is None:
+            embeddings = OllamaEmbeddings(base_url=base_url, model=model)
+            embeddings._client, embeddings._async_client = get_http_clients(base_url)
+            registry.embeddings[key] = embeddings
+        return embeddings
+
+def get_task_llm(task: str) -> OllamaLLM:
+    """Get the shared OllamaLLM configured for a task"""
+    route = MODEL_ROUTES[task]
+    return get_llm(route.model, keep_alive=OLLAMA_KEEP_ALIVE, **route.options())
+
+def get_task_chain(task: str, build: Callable[[OllamaLLM], Runnable]) -> Runnable:
+    """Get a compiled chain around the task's LLM, reporting the model of each call"""
+    route = MODEL_ROUTES[task]
+    return get_chain(
+        (task, route.model),
+        lambda: build(get_task_llm(task)).with_config(callbacks=[ModelUsageCallback(route)])
+    )
+
+def get_chain(key: Hashable, build: Callable[[], Runnable]) -> Runnable:
+    """Get a compiled chain, building it on first use.
+    
+    The key should identify both the task and the configuration the chain
+    was built with (e.g. the model name).
+    """
+    registry = _registry()
+    with _lock:
+        chain = registry.chains.get(key)
+        if chain is None:
+            chain = registry.chains[key] = build()
+        return chain
@@ -1,59 +1,119 @@
 # app/services/memory.py
-from pymongo import MongoClient
+import asyncio
+from bson import ObjectId
+from pymongo import AsyncMongoClient
+from pymongo.errors import BulkWriteError
 from datetime import datetime
 from typing import List, Dict, Any, Optional, Union
 import json
 
 # Use modern imports
-from langchain_mongodb import MongoDBChatMessageHistory
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, SystemMessage
-from langchain_core.chat_history import BaseChatMessageHistory
 
-from app.config import MONGODB_URI, MONGODB_DB
+from app.config import STUDENT_CACHE_MAX_SIZE, STUDENT_CACHE_TTL_SECONDS
 from app.models.student import Student, Fact, StudentFacts
 from app.models.conversation import MessageRole, Message, ExtractedFact, FactExtractionResult
+from app.services.cache import VersionedLRUCache
+from app.services.database import get_async_client, get_async_database
+from app.services.fact_history import FACT_HISTORY_COLLECTION, fact_change, fact_confirmation
+from app.services.fact_index import fact_value
+from app.services.history import AsyncMongoDBChatMessageHistory
+from app.services.telemetry import telemetry
+
+# Shared by every MemoryService in the process so that writes made through
+# one instance invalidate reads made through another. Writes from other
+# processes (e.g. fact extraction in the worker) show up once the entry
+# expires, so the TTL is kept short.
+student_cache = VersionedLRUCache(STUDENT_CACHE_MAX_SIZE, STUDENT_CACHE_TTL_SECONDS, name="student")
+
+def _student_cache_keys(student_id) -> List[Any]:
+    """Cache keys a student may be looked up by (string and ObjectId forms)"""
+    keys = [student_id, str(student_id)]
+    if ObjectId.is_valid(str(student_id)):
+        keys.append(ObjectId(str(student_id)))
+    return keys
 
 class MemoryService:
-    def __init__(self):
-        self.client = MongoClient(MONGODB_URI)
-        self.db = self.client[MONGODB_DB]
-        self.students = self.db.students
-        self.conversations = self.db.conversations
-        self.facts = self.db.facts
+    @property
+    def client(self) -> AsyncMongoClient:
+        """Get the shared async MongoDB client for the running event loop"""
+        return get_async_client()
+    
+    @property
+    def db(self):
+        return get_async_database()
+    
+    @property
+    def students(self):
+        return self.db.students
+    
+    @property
+    def conversations(self):
+        return self.db.conversations
+    
+    @property
+    def fact_history(self):
+        return self.db[FACT_HISTORY_COLLECTION]
     
     # Student Management
+    def _student_filter(self, student_id: str) -> Dict[str, Any]:
+        """Query for a student document by its (string) ID"""
+        if ObjectId.is_valid(str(student_id)):
+            return {"_id": ObjectId(str(student_id))}
+        return {"_id": student_id}
+    
     async def get_student(self, student_id: str) -> Optional[Dict[str, Any]]:
-        """Get a student by ID"""
-        return self.students.find_one({"_id": student_id})
+        """Get a student by ID (read through the student cache)"""
+        student = student_cache.get(student_id)
+        if student is not None:
+            return student
+        
+        version = student_cache.version(student_id)
+        student = await self.students.find_one(self._student_filter(student_id))
+        if student is not None:
+            student_cache.set(student_id, student, version)
+        return student
+    
+    def invalidate_student(self, student_id: str) -> None:
+        """Drop a student from the cache; called before and after each write so
+        neither cached nor in-flight reads can serve the old document"""
+        for key in _student_cache_keys(student_id):
+            student_cache.invalidate(key)
+    
+    def cache_stats(self) -> Dict[str, Any]:
+        """Hit/miss statistics of the student cache"""
+        return student_cache.stats()
     
     async def get_student_by_email(self, email: str) -> Optional[Dict[str, Any]]:
         """Get a student by email address"""
-        return self.students.find_one({"email": email})
+        return await self.students.find_one({"email": email})
     
-    async def create_student(self, student: Student) -> str:
+    async def create_student(self, student: Student, password_hash: Optional[str] = None) -> str:
         """Create a new student"""
         student_dict = student.dict(exclude={"id"})
+        if password_hash:
+            student_dict["password_hash"] = password_hash
         # Initialize with empty facts structure
         student_dict["facts"] = {"academic": {}, "career": {}, "personal": {}}
-        result = self.students.insert_one(student_dict)
+        result = await self.students.insert_one(student_dict)
         return str(result.inserted_id)
     
     async def update_student(self, student_id: str, data: Dict[str, Any]) -> bool:
         """Update student information"""
         data["updated_at"] = datetime.now()
-        result = self.students.update_one(
-            {"_id": student_id},
+        self.invalidate_student(student_id)
+        result = await self.students.update_one(
+            self._student_filter(student_id),
             {"$set": data}
         )
+        self.invalidate_student(student_id)
         return result.modified_count > 0
     
     # Conversation management using BaseChatMessageHistory
-    def get_message_history(self, conversation_id: str) -> BaseChatMessageHistory:
+    def get_message_history(self, conversation_id: str) -> AsyncMongoDBChatMessageHistory:
         """Get a message history for a conversation ID"""
-        return MongoDBChatMessageHistory(
-            connection_string=MONGODB_URI,
-            database_name=MONGODB_DB,
-            collection_name="conversations",
+        return AsyncMongoDBChatMessageHistory(
+            collection=self.conversations,
             session_id=conversation_id
         )
     
@@ -65,69 +125,127 @@ class MemoryService:
             "created_at": datetime.now(),
             "updated_at": datetime.now()
         }
-        result = self.conversations.insert_one(conversation)
+        result = await self.conversations.insert_one(conversation)
         conversation_id = str(result.inserted_id)
         
         # Create initial system message in the conversation
         message_history = self.get_message_history(conversation_id)
-        message_history.add_message(SystemMessage(
+        await message_history.aadd_messages([SystemMessage(
             content="I am an AI mentor for undergraduate students, providing support in academics, career planning, and mental wellbeing."
-        ))
+        )])
         
         return conversation_id
     
     async def get_conversation(self, conversation_id: str) -> Optional[Dict[str, Any]]:
         """Get a conversation by ID"""
-        return self.conversations.find_one({"_id": conversation_id})
+        return await self.conversations.find_one({"_id": conversation_id})
+    
+    def _conversation_filter(self, conversation_id: str) -> Dict[str, Any]:
+        """Query for a conversation document by its (string) ID"""
+        if ObjectId.is_valid(conversation_id):
+            return {"_id": ObjectId(conversation_id)}
+        return {"_id": conversation_id}
+    
+    async def get_conversation_summary(self, conversation_id: str) -> Dict[str, Any]:
+        """Get the rolling summary of a conversation's older messages"""
+        conversation = await self.conversations.find_one(
+            self._conversation_filter(conversation_id),
+            {"summary": 1}
+        )
+        if conversation and conversation.get("summary"):
+            return conversation["summary"]
+        return {"text": "", "through_id": None}
+    
+    async def update_conversation_summary(self,
+                                          conversation_id: str,
+                                          text: str,
+                                          through_id: str,
+                                          previous_through_id: Optional[str]) -> bool:
+        """Store a new rolling summary, unless another update got there first"""
+        query = self._conversation_filter(conversation_id)
+        query["summary.through_id"] = previous_through_id
+        result = await self.conversations.update_one(
+            query,
+            {"$set": {"summary": {
+                "text": text,
+                "through_id": through_id,
+                "updated_at": datetime.now()
+            }}}
+        )
+        return result.modified_count > 0
     
     async def get_recent_conversations(self, student_id: str, limit: int = 5) -> List[Dict[str, Any]]:
         """Get recent conversations for a student"""
-        return list(
+        cursor = (
             self.conversations.find({"student_id": student_id})
             .sort("updated_at", -1)
             .limit(limit)
         )
+        return await cursor.to_list()
     
     # Fact Management
     async def update_student_facts(self, student_id: str, facts: FactExtractionResult) -> bool:
         """Update student facts based on extraction results"""
-        success = True
+        if not facts.extracted_facts:
+            return True
+        
+        now = datetime.now()
+        current_facts = await self.get_student_facts(student_id)
+        history_updates = []
+        fact_updates = {}
         
-        # Store extracted facts in facts collection for history
         for fact in facts.extracted_facts:
-            fact_record = {
-                "student_id": student_id,
-                "category": fact.category,
-                "key": fact.key,
-                "value": fact.value,
-                "status": fact.status,
-                "confidence": fact.confidence,
-                "extracted_at": datetime.now()
-            }
-            self.facts.insert_one(fact_record)
-            
-            # Update the student document with the new/updated fact
             category = fact.category.lower()
-            key = fact.key
-            value = fact.value
-            
-            # Path to the fact within the document
-            fact_path = f"facts.{category}.{key}"
+            current = current_facts.get(category, {}).get(fact.key)
+            unchanged = current is not None and fact_value(current) == fact.value
             
-            # Update the student document
-            result = self.students.update_one(
-                {"_id": student_id},
-                {"$set": {
-                    fact_path: {
-                        "value": value,
-                        "last_updated": datetime.now(),
-                        "confidence": fact.confidence
-                    }
-                }}
-            )
+            # Restating a known value only bumps counters in the fact history
+            record = fact_confirmation if unchanged else fact_change
+            history_updates.append(record(
+                student_id, category, fact.key, fact.value, fact.confidence, fact.status, now
+            ))
             
-            if result.modified_count == 0:
+            if not unchanged:
+                # Path to the fact within the student document
+                fact_updates[f"facts.{category}.{fact.key}"] = {
+                    "value": fact.value,
+                    "last_updated": now,
+                    "confidence": fact.confidence
+                }
+        
+        # One bulk write for the history and one combined update for the student,
+        # issued concurrently instead of two sequential writes per fact
+        writes = [self.fact_history.bulk_write(history_updates, ordered=False)]
+        if fact_updates:
+            self.invalidate_student(student_id)
+            writes.append(self.students.update_one(
+                self._student_filter(student_id),
+                {"$set": fact_updates, "$inc": {"facts_version": 1}}
+            ))
+        results = await asyncio.gather(*writes, return_exceptions=True)
+        if fact_updates:
+            self.invalidate_student(student_id)
+        
+        # Work out which facts were persisted
+        history_result = results[0]
+        failed_records = set()
+        if isinstance(history_result, BulkWriteError):
+            failed_records = {error["index"] for error in history_result.details.get("writeErrors", [])}
+        elif isinstance(history_result, BaseException):
+            failed_records = set(range(len(history_updates)))
+        
+        student_updated = True
+        if fact_updates:
+            student_result = results[1]
+            student_updated = not isinstance(student_result, BaseException) and student_result.matched_count > 0
+        
+        success = True
+        for index, fact in enumerate(facts.extracted_facts):
+            path = f"facts.{fact.category.lower()}.{fact.key}"
+            if index in failed_records or (path in fact_updates and not student_updated):
                 success = False
+                telemetry.error("facts.persist_failed", student_id=student_id,
+                                fact=f"{fact.category}.{fact.key}")
         
         return success
     
@@ -138,10 +256,21 @@ class MemoryService:
             return student["facts"]
         return {"academic": {}, "career": {}, "personal": {}}
     
+    async def find_student_conversation(self, student_id: str) -> Optional[str]:
+        """ID of the student's conversation thread, without creating one"""
+        conversation = await self.conversations.find_one({"student_id": student_id}, {"_id": 1})
+        return str(conversation["_id"]) if conversation else None
+    
+    async def student_owns_conversation(self, student_id: str, conversation_id: str) -> bool:
+        """Whether a conversation belongs to the student"""
+        query = self._conversation_filter(conversation_id)
+        query["student_id"] = student_id
+        return await self.conversations.find_one(query, {"_id": 1}) is not None
+    
     async def get_or_create_student_conversation(self, student_id: str) -> str:
         """Get or create a single conversation thread for a student"""
         # Look for existing conversation for this student
-        conversation = self.conversations.find_one({"student_id": student_id})
+        conversation = await self.conversations.find_one({"student_id": student_id})
         
         if conversation:
             # Return existing conversation ID
@@ -154,13 +283,13 @@ class MemoryService:
                 "created_at": datetime.now(),
                 "updated_at": datetime.now()
             }
-            result = self.conversations.insert_one(conversation)
+            result = await self.conversations.insert_one(conversation)
             conversation_id = str(result.inserted_id)
             
             # Create initial system message
             message_history = self.get_message_history(conversation_id)
-            message_history.add_message(SystemMessage(
+            await message_history.aadd_messages([SystemMessage(
                 content="I am an AI mentor for undergraduate students, providing support in academics, career planning, and mental wellbeing."
-            ))
+            )])
             
             return conversation_id  
\ No newline at end of file
@@ -1,236 +1,249 @@
 # app/services/mentor.py
-from typing import Dict, Any, List, AsyncGenerator, Optional
+from typing import Dict, Any, List, AsyncGenerator, Optional, Set
 import asyncio
-import json
+import time
 
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_ollama import OllamaLLM
 from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables import RunnableConfig
-from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
-from langchain.callbacks.base import BaseCallbackHandler
-
-from langchain_core.runnables import RunnableConfig
+from langchain_core.messages import HumanMessage, AIMessage
+import numpy as np
 
+from app.config import SEMANTIC_MEMORY_ENABLED, SEMANTIC_MEMORY_MAX_TOKENS
+from app.services.fact_gate import fact_gate
+from app.services.context import ContextAssembler, estimate_tokens, MESSAGE_OVERHEAD_TOKENS
+from app.services.prompt_builder import PromptBuilder, PromptEvalCallback
+from app.services.jobs import JobQueue, FACT_EXTRACTION, CONVERSATION_SUMMARY, MESSAGE_EMBEDDING
+from app.services.llm import MODEL_ROUTES, MENTOR_TASK, get_task_llm, get_task_chain
 from app.services.memory import MemoryService
-from app.utils.prompts import PRIMARY_MENTOR_PROMPT
-from app.models.conversation import MessageRole, Message
-
-class StreamingCallback(BaseCallbackHandler):
-    """Callback handler for streaming LLM responses"""
-    
-    def __init__(self):
-        self.tokens = []
-    
-    def on_llm_new_token(self, token: str, **kwargs) -> None:
-        """Collect tokens as they're generated"""
-        self.tokens.append(token)
+from app.services.scheduler import llm_slot
+from app.services.semantic import SemanticMemory
+from app.services.telemetry import telemetry
 
 class MentorService:
     def __init__(self):
         self.memory_service = MemoryService()
         self.last_conversation_id = None
-        
-    def _create_ollama_llm(self, streaming=True):
-        """Create an Ollama LLM instance"""
-        from app.config import OLLAMA_BASE_URL, OLLAMA_MODEL
-        
-        # Set up callback for streaming
-        if streaming:
-            callback = StreamingCallback()
-            llm = OllamaLLM(
-                base_url=OLLAMA_BASE_URL,
-                model=OLLAMA_MODEL,
-                temperature=0.7,
-                callbacks=[callback]
-            )
-            return llm, callback
-        else:
-            llm = OllamaLLM(
-                base_url=OLLAMA_BASE_URL,
-                model=OLLAMA_MODEL,
-                temperature=0.7
-            )
-            return llm, None
+        self.job_queue = JobQueue()
+        self.context_assembler = ContextAssembler()
+        self.prompt_builder = PromptBuilder()
+        self.last_prompt_stats = None
+        self.semantic_memory = SemanticMemory() if SEMANTIC_MEMORY_ENABLED else None
+        
+    def _create_ollama_llm(self):
+        """Get the shared Ollama LLM instance for mentoring"""
+        return get_task_llm(MENTOR_TASK)
     
     def _create_mentor_chain(self):
-        """Create a conversation chain using LCEL"""
-        # Get the LLM
-        llm, _ = self._create_ollama_llm(streaming=False)
-        
-        # Create chat prompt template using modern LCEL approach
-        prompt = ChatPromptTemplate.from_messages([
-            SystemMessage(content=PRIMARY_MENTOR_PROMPT),
-            MessagesPlaceholder(variable_name="history"),
-            HumanMessage(content="{input}")
-        ])
-        
-        # Create the chain using LCEL
-        chain = prompt | llm | StrOutputParser()
-        
-        return chain
+        """Get the compiled mentor conversation chain"""
+        return get_task_chain(MENTOR_TASK, lambda llm: llm | StrOutputParser())
     
     async def respond_to_student(self, 
                            student_id: str, 
                            message: str, 
                            conversation_id: Optional[str] = None) -> AsyncGenerator[str, None]:
         """Generate a streaming response to a student message"""
+        turn_start = time.perf_counter()
+        
         # Get or create conversation using the unified approach
         if not conversation_id:
-            conversation_id = await self.memory_service.get_or_create_student_conversation(student_id)
+            with telemetry.span("mentor.conversation_lookup"):
+                conversation_id = await self.memory_service.get_or_create_student_conversation(student_id)
         
         # Store conversation_id in an instance variable
         self.last_conversation_id = conversation_id
         
-        # Get student information to include in the prompt
-        student = await self.memory_service.get_student(student_id)
-        student_facts = student.get("facts", {}) if student else {}
-        
-        # Format student context using the helper method
-        student_info = self._format_student_context(student, student_facts)
-        
         # Get conversation history
         message_history = self.memory_service.get_message_history(conversation_id)
         
-        # Add the new message to history
-        message_history.add_message(HumanMessage(content=message))
-        
-        # Get all messages - ENSURE WE HAVE ALL PREVIOUS MESSAGES
-        history = message_history.messages
-        
-        # Apply token limit handling for very long conversations, but ensure context is preserved
-        history = self._handle_history_token_limit(history)
-        
-        # For debugging (remove in production)
-        print(f"Number of messages in history: {len(history)}")
-        for i, msg in enumerate(history):
-            print(f"Message {i}: {type(msg).__name__}: {msg.content[:30]}...")
-        
-        # Create streaming callback
-        callback = StreamingCallback()
-        
-        # Get the LLM with streaming
-        llm, _ = self._create_ollama_llm(streaming=True)
-        
-        # Create runnable using LCEL with explicit memory context
-        prompt = ChatPromptTemplate.from_messages([
-            SystemMessage(content=PRIMARY_MENTOR_PROMPT + "\n\n" + student_info + 
-                        "\n\nIMPORTANT: You must reference previous parts of the conversation when relevant. You have full access to the conversation history."),
-            MessagesPlaceholder(variable_name="history"),
-            HumanMessage(content="{input}")
-        ])
-        
-        chain = prompt | llm | StrOutputParser()
-        
-        # Configure streaming
-        config = RunnableConfig(
-            callbacks=[callback]
-        )
-        
-        # Start a task to run the chain
-        task = asyncio.create_task(
-            chain.ainvoke(
-                {"history": history, "input": message},
-                config=config
+        # Embed the message for the recall search while the context is assembled
+        recall = asyncio.create_task(self._embed_for_recall(student_id, message))
+        store_message = None
+        persisted = False
+        status = "error"
+        try:
+            # Get student information and the summary of older messages concurrently
+            with telemetry.span("mentor.student_fetch"):
+                student, summary = await asyncio.gather(
+                    self.memory_service.get_student(student_id),
+                    self.memory_service.get_conversation_summary(conversation_id)
+                )
+            
+            # Stable segments first: static prompt, memoized student context, summary
+            system_prompt = self.prompt_builder.system_prompt(student, summary)
+            
+            # Select as much history as fits the token budget
+            # (the recall reserve is constant so it doesn't move the history window)
+            with telemetry.span("mentor.history_load"):
+                history = await self.context_assembler.assemble(
+                    message_history, system_prompt, message, summarized_through=summary["through_id"],
+                    reserved_tokens=SEMANTIC_MEMORY_MAX_TOKENS if self.semantic_memory else 0
+                )
+            with telemetry.span("mentor.recall"):
+                # Searched only now, so messages already in the prompt don't use up the top k
+                recalled = self._select_recalled(
+                    await self._recall_messages(student_id, await recall, {msg.id for msg in history})
+                )
+            
+            # Store the new message while the LLM works on the reply
+            store_message = asyncio.create_task(
+                message_history.aadd_messages([HumanMessage(content=message)])
             )
-        )
             
-        # Stream tokens as they're generated
-        full_response = ""
-        previous_token_count = 0
-        
-        while not task.done():
-            await asyncio.sleep(0.05)  # Small delay to allow token collection
+            # Render the prompt, volatile content last
+            with telemetry.span("mentor.prompt_build"):
+                prompt = self.prompt_builder.render(conversation_id, system_prompt, history, message, recalled)
+            telemetry.log("mentor.prompt", level="debug", conversation_id=conversation_id,
+                          history_messages=len(history), recalled_messages=len(recalled),
+                          prompt_tokens=prompt.stats.prompt_tokens)
             
-            if callback and len(callback.tokens) > previous_token_count:
-                new_tokens = callback.tokens[previous_token_count:]
-                for token in new_tokens:
-                    full_response += token
-                    yield token
-                previous_token_count = len(callback.tokens)
-        
-        # Get any remaining tokens after the task is done
-        if callback and len(callback.tokens) > previous_token_count:
-            new_tokens = callback.tokens[previous_token_count:]
-            for token in new_tokens:
-                full_response += token
-                yield token
-        
-        # Save the AI's response to the history
-        message_history.add_message(AIMessage(content=full_response))
-        
-        # After generating the response, extract facts in the background
-        asyncio.create_task(
-            self._extract_facts(student_id, conversation_id, message, full_response)
-        )
-        
-        # Yield a special token to indicate the end and include the conversation ID
-        yield f"<CONVERSATION_ID>{conversation_id}</CONVERSATION_ID>"
-        
-    def _format_student_context(self, student, student_facts):
-        """Format student information into a rich context for the LLM"""
-        if not student:
-            return ""
+            # Get the compiled chain
+            chain = self._create_mentor_chain()
+            prompt_eval = PromptEvalCallback()
             
-        context = f"""
-        STUDENT PROFILE:
-        Name: {student.get('name', 'Unknown')}
-        University: {student.get('university', 'Unknown')}
-        Program: {student.get('program', 'Unknown')}
-        Year: {student.get('year', 'Unknown')}
-        """
-        
-        # Add facts if available
-        if student_facts:
-            # Academic facts
-            if "academic" in student_facts and student_facts["academic"]:
-                context += "\nACADEMIC INFORMATION:\n"
-                for key, value in student_facts["academic"].items():
-                    fact_value = value.get('value', value) if isinstance(value, dict) else value
-                    context += f"- {key.replace('_', ' ').title()}: {fact_value}\n"
+            # Stream tokens the moment Ollama emits them. The stream is pulled by
+            # our consumer, so a slow reader applies backpressure to the LLM call.
+            # The reply holds an interactive slot on the Ollama server while it streams.
+            # Spans can't be held across yields, so the LLM duration is observed by hand.
+            response_parts = []
+            llm_start = time.perf_counter()
+            llm_status = "error"
+            try:
+                async with llm_slot(MENTOR_TASK):
+                    async for token in chain.astream(prompt.text, config={"callbacks": [prompt_eval]}):
+                        if not token:
+                            continue
+                        if not response_parts:
+                            telemetry.observe("llm_ttft_seconds", time.perf_counter() - llm_start, task="mentor")
+                        response_parts.append(token)
+                        yield token
+                llm_status = "ok"
+            except (GeneratorExit, asyncio.CancelledError):
+                llm_status = "cancelled"
+                raise
+            finally:
+                telemetry.observe("span_duration_seconds", time.perf_counter() - llm_start,
+                                  span="mentor.llm", status=llm_status)
+            full_response = "".join(response_parts)
             
-            # Career facts
-            if "career" in student_facts and student_facts["career"]:
-                context += "\nCAREER INFORMATION:\n"
-                for key, value in student_facts["career"].items():
-                    fact_value = value.get('value', value) if isinstance(value, dict) else value
-                    context += f"- {key.replace('_', ' ').title()}: {fact_value}\n"
+            # Report the prompt size and the shared prefix (both estimated); the
+            # measured prompt_eval_count is counted per model by ModelUsageCallback
+            prompt.stats.evaluated_tokens = prompt_eval.prompt_eval_count
+            prompt.stats.model = MODEL_ROUTES[MENTOR_TASK].model
+            self.last_prompt_stats = prompt.stats
+            telemetry.incr("prompt_estimated_tokens_total", prompt.stats.prompt_tokens, task="mentor")
+            telemetry.incr("prompt_estimated_prefix_reused_tokens_total", prompt.stats.prefix_reused_tokens, task="mentor")
             
-            # Personal facts
-            if "personal" in student_facts and student_facts["personal"]:
-                context += "\nPERSONAL INFORMATION:\n"
-                for key, value in student_facts["personal"].items():
-                    fact_value = value.get('value', value) if isinstance(value, dict) else value
-                    context += f"- {key.replace('_', ' ').title()}: {fact_value}\n"
-                    
-        return context
-    
-    def _handle_history_token_limit(self, history):
-        """Handle potential token limitations for very long conversation histories"""
-        # If history is short enough, return all of it
-        if len(history) < 30:  # Increased from 20 to ensure enough context
-            return history
+            # Save the AI's response to the history, after the student's message
+            with telemetry.span("mentor.persist"):
+                message_ids = await store_message
+                message_ids += await message_history.aadd_messages([AIMessage(content=full_response)])
+            persisted = True
             
-        # Otherwise, keep system message, early context, and most recent messages
-        system_messages = [msg for msg in history if isinstance(msg, SystemMessage)]
-        non_system = [msg for msg in history if not isinstance(msg, SystemMessage)]
-        
-        # Keep first few messages for context and most recent messages
-        early_context = non_system[:3]  # Keep first 3 messages for context
-        recent_messages = non_system[-20:]  # Keep last 20 messages
-        
-        # Return system messages plus context messages plus recent messages
-        return system_messages + early_context + recent_messages
-        
+            # Queue fact extraction, the summary update and message embeddings for the background workers
+            await asyncio.gather(
+                self._enqueue_fact_extraction(student_id, conversation_id, message, full_response),
+                self._enqueue_summary_update(conversation_id,
+                                             self.context_assembler.window_start(message_history.session_id)),
+                self._enqueue_embeddings(student_id, conversation_id, message_ids)
+            )
+            status = "ok"
+            
+            # Yield a special token to indicate the end and include the conversation ID
+            yield f"<CONVERSATION_ID>{conversation_id}</CONVERSATION_ID>"
+        except (GeneratorExit, asyncio.CancelledError):
+            if status != "ok":
+                status = "cancelled"
+            raise
+        finally:
+            telemetry.observe("span_duration_seconds", time.perf_counter() - turn_start,
+                              span="mentor.turn", status=status)
+            if not persisted:
+                await self._abandon_turn(message_history, recall, store_message)
+        
+    async def _abandon_turn(self, message_history, recall: asyncio.Task, store_message: Optional[asyncio.Task]):
+        """Clean up after a turn that ended before its reply was stored: stop the
+        recall embedding and remove the student's message so no unanswered turn remains"""
+        recall.cancel()
+        if store_message is None:
+            return
+        try:
+            message_ids = await store_message
+            await message_history.adelete_messages(message_ids)
+        except Exception as e:
+            telemetry.error("mentor.abandon_turn_failed", e, conversation_id=message_history.session_id)
+    
     async def get_last_conversation_id(self) -> str:
         """Get the ID of the last conversation used"""
         return self.last_conversation_id
     
-    async def _extract_facts(self, student_id: str, conversation_id: str, message: str, response: str):
-        """Extract facts from conversation and update student knowledge"""
-        from app.services.intelligence import IntelligenceService
-        intelligence = IntelligenceService()
+    async def _enqueue_fact_extraction(self, student_id: str, conversation_id: str, message: str, response: str):
+        """Queue a turn for fact extraction; pending turns of a student are coalesced"""
+        if not fact_gate.should_extract(message):
+            return
+        try:
+            await self.job_queue.enqueue(FACT_EXTRACTION, student_id, {
+                "conversation_id": conversation_id,
+                "message": message,
+                "response": response
+            })
+        except Exception as e:
+            telemetry.error("mentor.enqueue_fact_extraction_failed", e, student_id=student_id)
+
+    async def _enqueue_summary_update(self, conversation_id: str, window_start: Optional[str]):
+        """Queue an update of the conversation's rolling summary, covering the
+        messages older than the window the prompt was built from"""
+        if window_start is None:
+            # The window holds no stored message: nothing is there to
+            # summarize yet, or a single oversized message was truncated
+            return
+        try:
+            await self.job_queue.enqueue(CONVERSATION_SUMMARY, conversation_id, {"window_start": window_start})
+        except Exception as e:
+            telemetry.error("mentor.enqueue_summary_failed", e, conversation_id=conversation_id)
+
+    async def _enqueue_embeddings(self, student_id: str, conversation_id: str, message_ids: List[str]):
+        """Queue new messages for embedding into the student's semantic index"""
+        if not self.semantic_memory:
+            return
+        try:
+            # Every message must be indexed, so items are never trimmed; they
+            # carry only IDs to keep the job document small
+            await self.job_queue.enqueue(MESSAGE_EMBEDDING, student_id, {
+                "conversation_id": conversation_id,
+                "message_ids": message_ids
+            }, max_items=None)
+        except Exception as e:
+            telemetry.error("mentor.enqueue_embeddings_failed", e, student_id=student_id)
+    
+    async def _embed_for_recall(self, student_id: str, message: str) -> Optional[np.ndarray]:
+        """Query vector of the new message, or None without semantic memory"""
+        if not self.semantic_memory:
+            return None
         try:
-            await intelligence.extract_facts(student_id, conversation_id, message, response)
+            return await self.semantic_memory.embed_query(message)
         except Exception as e:
-            print(f"Error extracting facts: {e}")
\ No newline at end of file
+            # The reply works without recalled messages
+            telemetry.error("mentor.recall_failed", e, student_id=student_id)
+            return None
+    
+    async def _recall_messages(self, student_id: str, query_vector: Optional[np.ndarray],
+                               exclude_ids: Set[str]) -> List[Dict[str, Any]]:
+        """Stored messages of the student most similar to the new one, other than the excluded ones"""
+        if query_vector is None:
+            return []
+        try:
+            return await self.semantic_memory.search_vector(student_id, query_vector, exclude_ids=exclude_ids)
+        except Exception as e:
+            telemetry.error("mentor.recall_failed", e, student_id=student_id)
+            return []
+    
+    def _select_recalled(self, recalled: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Keep the best recalled messages within the reserve"""
+        selected = []
+        remaining = SEMANTIC_MEMORY_MAX_TOKENS
+        for item in recalled:
+            tokens = estimate_tokens(item["text"]) + MESSAGE_OVERHEAD_TOKENS
+            if tokens > remaining:
+                continue
+            selected.append(item)
+            remaining -= tokens
+        return selected
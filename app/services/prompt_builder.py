@@ -0,0 +1,177 @@
+# app/services/prompt_builder.py
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import BaseMessage, SystemMessage
+from langchain_core.outputs import LLMResult
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+
+from app.services.context import estimate_tokens
+from app.utils.prompts import PRIMARY_MENTOR_PROMPT, MENTOR_HISTORY_INSTRUCTIONS
+
+# Segments are ordered from most to least stable so consecutive prompts of a
+# conversation share the longest possible prefix, which Ollama can serve from
+# its KV cache instead of prefilling again:
+#   1. static mentor prompt and instructions (identical for every student)
+#   2. student context (changes only when the profile or facts change)
+#   3. rolling summary (changes every few turns)
+#   4. history: stored system message, early context, recent window
+#   5. messages recalled from earlier conversations (depend on the new message)
+#   6. the new message
+STATIC_SYSTEM_PROMPT = PRIMARY_MENTOR_PROMPT + "\n\n" + MENTOR_HISTORY_INSTRUCTIONS
+
+MENTOR_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", "{system_prompt}"),
+    MessagesPlaceholder(variable_name="history"),
+    MessagesPlaceholder(variable_name="recalled", optional=True),
+    ("human", "{input}")
+])
+
+class PromptStats(BaseModel):
+    """Prompt size and cache reuse of one turn.
+    
+    prompt_tokens and prefix_reused_tokens are estimates (see estimate_tokens);
+    evaluated_tokens is measured by Ollama. The two are not comparable, so
+    no reuse figure is derived from their difference.
+    """
+    prompt_tokens: int
+    # Model that generated the reply
+    model: Optional[str] = None
+    # Estimated tokens shared with the previous prompt of the conversation
+    prefix_reused_tokens: int = 0
+    # Tokens Ollama actually had to evaluate (prompt_eval_count), when reported;
+    # tokens served from its cache are not counted
+    evaluated_tokens: Optional[int] = None
+
+class BuiltPrompt(BaseModel):
+    text: str
+    stats: PromptStats
+
+class PromptEvalCallback(BaseCallbackHandler):
+    """Captures Ollama's prompt_eval_count from the final generation chunk"""
+    
+    def __init__(self):
+        self.prompt_eval_count: Optional[int] = None
+    
+    def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+        if response.generations and response.generations[0]:
+            info = response.generations[0][0].generation_info or {}
+            self.prompt_eval_count = info.get("prompt_eval_count")
+
+class PromptBuilder:
+    """Builds prefix-stable mentor prompts"""
+    
+    def __init__(self, max_students: int = 10000, max_conversations: int = 1000):
+        self.max_students = max_students
+        self.max_conversations = max_conversations
+        self._student_contexts: "OrderedDict[Any, str]" = OrderedDict()
+        self._last_prompts: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def system_prompt(self, student: Optional[Dict[str, Any]], summary: Dict[str, Any]) -> str:
+        """Static prompt, then student context, then the conversation summary"""
+        return STATIC_SYSTEM_PROMPT + self.student_context(student) + self.format_summary(summary)
+    
+    def render(self,
+               conversation_id: str,
+               system_prompt: str,
+               history: List[BaseMessage],
+               message: str,
+               recalled: Optional[List[Dict[str, Any]]] = None) -> BuiltPrompt:
+        """Render the final prompt text and compare it to the conversation's previous prompt"""
+        text = MENTOR_PROMPT.format_prompt(
+            system_prompt=system_prompt, history=history, input=message,
+            recalled=self.format_recalled(recalled)
+        ).to_string()
+        
+        with self._lock:
+            previous = self._last_prompts.get(conversation_id, "")
+            self._remember(self._last_prompts, conversation_id, text, self.max_conversations)
+        shared = os.path.commonprefix([previous, text]) if previous else ""
+        
+        return BuiltPrompt(
+            text=text,
+            stats=PromptStats(
+                prompt_tokens=estimate_tokens(text),
+                prefix_reused_tokens=estimate_tokens(shared)
+            )
+        )
+    
+    def student_context(self, student: Optional[Dict[str, Any]]) -> str:
+        """Student context block, memoized per profile and facts version"""
+        if not student:
+            return ""
+        key = (str(student.get("_id")), student.get("updated_at"), student.get("facts_version", 0))
+        with self._lock:
+            context = self._student_contexts.get(key)
+            if context is not None:
+                self._student_contexts.move_to_end(key)
+                return context
+        context = "\n\n" + self.format_student_context(student, student.get("facts", {}))
+        with self._lock:
+            self._remember(self._student_contexts, key, context, self.max_students)
+        return context
+    
+    def _remember(self, entries: OrderedDict, key: Any, value: str, max_size: int) -> None:
+        entries[key] = value
+        entries.move_to_end(key)
+        while len(entries) > max_size:
+            entries.popitem(last=False)
+    
+    def format_summary(self, summary):
+        """Format the rolling summary of older messages for the system prompt"""
+        if not summary.get("text"):
+            return ""
+        return "\n\nSUMMARY OF EARLIER CONVERSATION (older messages not shown below):\n" + summary["text"]
+    
+    def format_recalled(self, recalled: Optional[List[Dict[str, Any]]]) -> List[BaseMessage]:
+        """Format messages recalled by semantic search as a system message"""
+        if not recalled:
+            return []
+        lines = [
+            f"- {'Student' if item['role'] == 'human' else 'Mentor'}: {item['text']}"
+            for item in recalled
+        ]
+        return [SystemMessage(content="RELEVANT EARLIER MESSAGES (from past conversations with this student):\n" + "\n".join(lines))]
+    
+    def format_student_context(self, student, student_facts):
+        """Format student information into a rich context for the LLM"""
+        if not student:
+            return ""
+            
+        context = f"""
+        STUDENT PROFILE:
+        Name: {student.get('name', 'Unknown')}
+        University: {student.get('university', 'Unknown')}
+        Program: {student.get('program', 'Unknown')}
+        Year: {student.get('year', 'Unknown')}
+        """
+        
+        # Add facts if available
+        if student_facts:
+            # Academic facts
+            if "academic" in student_facts and student_facts["academic"]:
+                context += "\nACADEMIC INFORMATION:\n"
+                for key, value in student_facts["academic"].items():
+                    fact_value = value.get('value', value) if isinstance(value, dict) else value
+                    context += f"- {key.replace('_', ' ').title()}: {fact_value}\n"
+            
+            # Career facts
+            if "career" in student_facts and student_facts["career"]:
+                context += "\nCAREER INFORMATION:\n"
+                for key, value in student_facts["career"].items():
+                    fact_value = value.get('value', value) if isinstance(value, dict) else value
+                    context += f"- {key.replace('_', ' ').title()}: {fact_value}\n"
+            
+            # Personal facts
+            if "personal" in student_facts and student_facts["personal"]:
+                context += "\nPERSONAL INFORMATION:\n"
+                for key, value in student_facts["personal"].items():
+                    fact_value = value.get('value', value) if isinstance(value, dict) else value
+                    context += f"- {key.replace('_', ' ').title()}: {fact_value}\n"
+                    
+        return context
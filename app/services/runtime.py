@@ -0,0 +1,103 @@
+# app/services/runtime.py
+import asyncio
+import atexit
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Any, AsyncIterator, Awaitable, Iterator, Optional, TypeVar
+
+T = TypeVar("T")
+
+# Marks the end of a stream in the hand-over queue
+_DONE = object()
+
+class BackgroundRuntime:
+    """A long-lived event loop on a daemon thread, for synchronous callers.
+    
+    Async clients are bound to the loop they were created on, so running every
+    call on one loop keeps their connection pools (and any background tasks)
+    alive between calls, unlike asyncio.run which creates and closes a loop
+    each time.
+    """
+    
+    def __init__(self, name: str = "horizon-runtime"):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run_loop, name=name, daemon=True)
+        self._thread.start()
+    
+    def _run_loop(self) -> None:
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+    
+    def submit(self, coroutine: Awaitable[T]) -> "Future[T]":
+        """Schedule a coroutine on the runtime loop"""
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+    
+    def run(self, coroutine: Awaitable[T], timeout: Optional[float] = None) -> T:
+        """Run a coroutine on the runtime loop and wait for its result"""
+        future = self.submit(coroutine)
+        try:
+            return future.result(timeout)
+        except BaseException:
+            future.cancel()
+            raise
+    
+    def stream(self, iterator: AsyncIterator[T], timeout: Optional[float] = None) -> Iterator[T]:
+        """Iterate an async iterator on the runtime loop, yielding its items here.
+        
+        Items are handed over through a thread-safe queue as soon as they are
+        produced; closing the returned iterator early cancels the producer.
+        """
+        items: "queue.Queue[Any]" = queue.Queue()
+        
+        async def produce():
+            try:
+                async for item in iterator:
+                    items.put(item)
+            except BaseException as e:
+                items.put(e)
+                raise
+            finally:
+                items.put(_DONE)
+        
+        future = self.submit(produce())
+        try:
+            while True:
+                item = items.get(timeout=timeout)
+                if item is _DONE:
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            future.cancel()
+    
+    def shutdown(self, timeout: float = 5.0) -> None:
+        """Cancel pending tasks and stop the loop"""
+        if not self.loop.is_running():
+            return
+        
+        async def cancel_tasks():
+            tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        
+        try:
+            self.run(cancel_tasks(), timeout=timeout)
+        finally:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join(timeout)
+
+_runtime: Optional[BackgroundRuntime] = None
+_lock = threading.Lock()
+
+def get_runtime() -> BackgroundRuntime:
+    """The process-wide runtime, started on first use"""
+    global _runtime
+    if _runtime is None:
+        with _lock:
+            if _runtime is None:
+                _runtime = BackgroundRuntime()
+                atexit.register(_runtime.shutdown)
+    return _runtime
@@ -0,0 +1,337 @@
+# app/services/scheduler.py
+import asyncio
+import random
+import threading
+import time
+import uuid
+import weakref
+from collections import deque
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Deque, Dict, Optional, Set
+
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import BulkWriteError
+
+from app.config import (
+    OLLAMA_BASE_URL, LLM_MAX_CONCURRENCY, LLM_ENDPOINT_CONCURRENCY, LLM_INTERACTIVE_RESERVED_SLOTS,
+    LLM_MAX_QUEUE_INTERACTIVE, LLM_MAX_QUEUE_BACKGROUND,
+    LLM_QUEUE_TIMEOUT_INTERACTIVE_SECONDS, LLM_QUEUE_TIMEOUT_BACKGROUND_SECONDS,
+    LLM_SHARED_SLOTS, LLM_SLOT_LEASE_SECONDS, LLM_SLOT_POLL_SECONDS
+)
+from app.services.database import get_async_database
+from app.services.llm import MENTOR_TASK, EXTRACTION_TASK, SUMMARY_TASK, EMBEDDING_TASK
+from app.services.telemetry import telemetry
+
+# Priority classes, most urgent first
+INTERACTIVE = 0
+BACKGROUND = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+
+# Default priority of each task: the mentor reply is what a student waits on
+TASK_PRIORITIES: Dict[str, int] = {
+    MENTOR_TASK: INTERACTIVE,
+    EXTRACTION_TASK: BACKGROUND,
+    SUMMARY_TASK: BACKGROUND,
+    EMBEDDING_TASK: BACKGROUND,
+}
+
+class LLMQueueFull(RuntimeError):
+    """The wait queue of the priority class is full"""
+
+class LLMQueueTimeout(TimeoutError):
+    """No slot became free within the priority's queue timeout"""
+
+LLM_SLOTS_COLLECTION = "llm_slots"
+
+def _background_limit(limit: int, reserved_slots: int) -> int:
+    """Slots background work may hold: all but the reserved ones, but at least one"""
+    return max(1, limit - reserved_slots)
+
+class _Endpoint:
+    """Slots and wait queues of one Ollama server"""
+    
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.active = {INTERACTIVE: 0, BACKGROUND: 0}
+        self.waiters: Dict[int, Deque[asyncio.Future]] = {INTERACTIVE: deque(), BACKGROUND: deque()}
+
+class _Lease:
+    """A shared slot held by this process, renewed until it is released"""
+    
+    def __init__(self, slots: "SharedSlots", slot_id: str, holder: str):
+        self.slots = slots
+        self.slot_id = slot_id
+        self.holder = holder
+        self._renewal = asyncio.create_task(self._renew())
+    
+    async def _renew(self) -> None:
+        while True:
+            await asyncio.sleep(self.slots.lease_seconds / 3)
+            try:
+                renewed = await self.slots.renew(self.slot_id, self.holder)
+            except Exception as e:
+                telemetry.error("llm.slot_renew_failed", e, slot=self.slot_id)
+                continue
+            if not renewed:
+                # The lease ran out and another request took the slot
+                telemetry.log("llm.slot_lease_lost", level="warning", slot=self.slot_id)
+                return
+    
+    async def release(self) -> None:
+        self._renewal.cancel()
+        await self.slots.release(self.slot_id, self.holder)
+
+class SharedSlots:
+    """LLM slots shared by every process talking to an endpoint.
+    
+    Each endpoint has `limit` slot documents in MongoDB. A request holds one
+    by writing its holder token and a lease expiry, renewed while it runs, so
+    the slots of a crashed process free up once their lease runs out.
+    Background requests only take the lower slots, leaving the reserved ones
+    to interactive requests, and take none while an interactive request is
+    waiting, so the worker backs off while students wait for replies.
+    """
+    
+    def __init__(self,
+                 collection_name: str = LLM_SLOTS_COLLECTION,
+                 lease_seconds: float = LLM_SLOT_LEASE_SECONDS,
+                 poll_seconds: float = LLM_SLOT_POLL_SECONDS):
+        self.collection_name = collection_name
+        self.lease_seconds = lease_seconds
+        self.poll_seconds = poll_seconds
+        self._created: Set[str] = set()
+    
+    @property
+    def slots(self):
+        return get_async_database()[self.collection_name]
+    
+    async def _ensure_slots(self, url: str, limit: int) -> None:
+        if f"{url}#{limit}" in self._created:
+            return
+        try:
+            await self.slots.insert_many(
+                [{"_id": f"{url}#{index}", "endpoint": url, "index": index, "holder": None} for index in range(limit)],
+                ordered=False
+            )
+        except BulkWriteError as e:
+            # Slots created by another process are fine
+            if any(error["code"] != 11000 for error in e.details.get("writeErrors", [])):
+                raise
+        self._created.add(f"{url}#{limit}")
+    
+    async def _interactive_waiting(self, url: str, now: datetime) -> bool:
+        signal = await self.slots.find_one({"_id": f"{url}#interactive_waiting", "waiting_until": {"$gt": now}}, {"_id": 1})
+        return signal is not None
+    
+    async def _signal_interactive_waiting(self, url: str, now: datetime) -> None:
+        # Refreshed on every attempt, so it lapses soon after the last interactive waiter
+        await self.slots.update_one(
+            {"_id": f"{url}#interactive_waiting"},
+            {"$set": {"endpoint": url, "waiting_until": now + timedelta(seconds=self.poll_seconds * 4)}},
+            upsert=True
+        )
+    
+    async def _try_acquire(self, url: str, allowed: int, holder: str, priority: int, now: datetime) -> Optional[str]:
+        slot = await self.slots.find_one_and_update(
+            {"endpoint": url, "index": {"$lt": allowed}, "$or": [{"holder": None}, {"expires_at": {"$lte": now}}]},
+            {"$set": {"holder": holder, "expires_at": now + timedelta(seconds=self.lease_seconds)}},
+            projection={"_id": 1},
+            # Interactive requests take the reserved (highest) slots first,
+            # leaving the lower ones to background work
+            sort=[("index", DESCENDING if priority == INTERACTIVE else ASCENDING)]
+        )
+        return slot["_id"] if slot else None
+    
+    async def acquire(self, url: str, priority: int, limit: int, reserved_slots: int, timeout: float) -> _Lease:
+        """Lease one of the endpoint's slots, retrying until `timeout` runs out.
+        A lease lost to cancellation mid-update is freed when it expires."""
+        await self._ensure_slots(url, limit)
+        allowed = limit if priority == INTERACTIVE else _background_limit(limit, reserved_slots)
+        max_pause = self.poll_seconds if priority == INTERACTIVE else self.poll_seconds * 4
+        pause = min(0.02, max_pause)
+        holder = uuid.uuid4().hex
+        deadline = time.monotonic() + timeout
+        while True:
+            now = datetime.now(timezone.utc)
+            if priority == INTERACTIVE or not await self._interactive_waiting(url, now):
+                slot_id = await self._try_acquire(url, allowed, holder, priority, now)
+                if slot_id is not None:
+                    return _Lease(self, slot_id, holder)
+            if priority == INTERACTIVE:
+                await self._signal_interactive_waiting(url, now)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                name = PRIORITY_NAMES[priority]
+                telemetry.incr("llm_rejected_total", endpoint=url, priority=name, reason="timeout")
+                raise LLMQueueTimeout(f"No shared LLM slot for {name} request to {url} within {timeout:.1f}s")
+            await asyncio.sleep(min(remaining, pause * random.uniform(0.5, 1.0)))
+            pause = min(pause * 2, max_pause)
+    
+    async def renew(self, slot_id: str, holder: str) -> bool:
+        """Extend a lease; False if it is no longer held"""
+        result = await self.slots.update_one(
+            {"_id": slot_id, "holder": holder},
+            {"$set": {"expires_at": datetime.now(timezone.utc) + timedelta(seconds=self.lease_seconds)}}
+        )
+        return result.matched_count > 0
+    
+    async def release(self, slot_id: str, holder: str) -> None:
+        """Free a slot unless the lease already passed to someone else"""
+        await self.slots.update_one({"_id": slot_id, "holder": holder}, {"$set": {"holder": None}})
+
+class LLMScheduler:
+    """Admission control for LLM requests of one event loop.
+    
+    Each endpoint runs at most `limit` requests at once. Waiting interactive
+    requests are always admitted before background ones, and background work
+    leaves the last `reserved_slots` slots free, as long as that leaves it at
+    least one, so a live reply does not queue behind a burst of extractions.
+    Queues are bounded and waits time out, so overload surfaces as an error
+    instead of unbounded latency.
+    
+    With `shared_slots`, an admitted request also leases a slot shared with
+    the other processes, so the limits hold across the API, the Streamlit app
+    and the worker; without it they only hold within this event loop.
+    """
+    
+    def __init__(self,
+                 default_limit: int = LLM_MAX_CONCURRENCY,
+                 endpoint_limits: Optional[Dict[str, int]] = None,
+                 reserved_slots: int = LLM_INTERACTIVE_RESERVED_SLOTS,
+                 max_queue: Optional[Dict[int, int]] = None,
+                 timeouts: Optional[Dict[int, float]] = None,
+                 shared_slots: Optional[SharedSlots] = None):
+        self.default_limit = default_limit
+        self.endpoint_limits = LLM_ENDPOINT_CONCURRENCY if endpoint_limits is None else endpoint_limits
+        self.reserved_slots = reserved_slots
+        self.max_queue = max_queue or {INTERACTIVE: LLM_MAX_QUEUE_INTERACTIVE, BACKGROUND: LLM_MAX_QUEUE_BACKGROUND}
+        self.timeouts = timeouts or {
+            INTERACTIVE: LLM_QUEUE_TIMEOUT_INTERACTIVE_SECONDS,
+            BACKGROUND: LLM_QUEUE_TIMEOUT_BACKGROUND_SECONDS
+        }
+        self.shared_slots = shared_slots
+        self._endpoints: Dict[str, _Endpoint] = {}
+    
+    def _endpoint(self, url: str) -> _Endpoint:
+        endpoint = self._endpoints.get(url)
+        if endpoint is None:
+            endpoint = self._endpoints[url] = _Endpoint(max(1, self.endpoint_limits.get(url, self.default_limit)))
+        return endpoint
+    
+    def _can_start(self, endpoint: _Endpoint, priority: int) -> bool:
+        if sum(endpoint.active.values()) >= endpoint.limit:
+            return False
+        if priority == BACKGROUND:
+            # Background work leaves the reserved slots to interactive requests
+            return endpoint.active[BACKGROUND] < _background_limit(endpoint.limit, self.reserved_slots)
+        return True
+    
+    @asynccontextmanager
+    async def slot(self, priority: int = INTERACTIVE, endpoint_url: str = OLLAMA_BASE_URL) -> AsyncIterator[None]:
+        """Hold one of the endpoint's slots for the duration of the block"""
+        endpoint = self._endpoint(endpoint_url)
+        start = time.perf_counter()
+        lease = None
+        try:
+            await self._acquire(endpoint, endpoint_url, priority)
+            if self.shared_slots is not None:
+                try:
+                    # The shared lease comes out of the same queue timeout
+                    remaining = self.timeouts[priority] - (time.perf_counter() - start)
+                    lease = await self.shared_slots.acquire(
+                        endpoint_url, priority, endpoint.limit, self.reserved_slots, remaining
+                    )
+                except BaseException:
+                    self._release(endpoint, endpoint_url, priority)
+                    raise
+        finally:
+            telemetry.observe("llm_queue_wait_seconds", time.perf_counter() - start,
+                              endpoint=endpoint_url, priority=PRIORITY_NAMES[priority])
+        try:
+            yield
+        finally:
+            try:
+                if lease is not None:
+                    await lease.release()
+            finally:
+                self._release(endpoint, endpoint_url, priority)
+    
+    async def _acquire(self, endpoint: _Endpoint, url: str, priority: int) -> None:
+        name = PRIORITY_NAMES[priority]
+        # Requests of the same or a higher priority that are already waiting go first
+        queued_ahead = any(endpoint.waiters[p] for p in endpoint.waiters if p <= priority)
+        if not queued_ahead and self._can_start(endpoint, priority):
+            endpoint.active[priority] += 1
+            self._report(endpoint, url)
+            return
+        
+        if len(endpoint.waiters[priority]) >= self.max_queue[priority]:
+            telemetry.incr("llm_rejected_total", endpoint=url, priority=name, reason="queue_full")
+            raise LLMQueueFull(f"LLM queue for {name} requests to {url} is full")
+        
+        waiter = asyncio.get_running_loop().create_future()
+        endpoint.waiters[priority].append(waiter)
+        self._report(endpoint, url)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout=self.timeouts[priority])
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as we gave up; pass it on
+                self._release(endpoint, url, priority)
+            else:
+                waiter.cancel()
+                endpoint.waiters[priority].remove(waiter)
+                self._report(endpoint, url)
+            if isinstance(e, asyncio.TimeoutError):
+                telemetry.incr("llm_rejected_total", endpoint=url, priority=name, reason="timeout")
+                raise LLMQueueTimeout(f"No LLM slot for {name} request to {url} within {self.timeouts[priority]}s")
+            raise
+    
+    def _release(self, endpoint: _Endpoint, url: str, priority: int) -> None:
+        endpoint.active[priority] -= 1
+        # Hand free slots to waiters, most urgent first
+        for waiting_priority in sorted(endpoint.waiters):
+            waiters = endpoint.waiters[waiting_priority]
+            while waiters and self._can_start(endpoint, waiting_priority):
+                waiter = waiters.popleft()
+                if waiter.done():
+                    continue
+                endpoint.active[waiting_priority] += 1
+                waiter.set_result(None)
+        self._report(endpoint, url)
+    
+    def _report(self, endpoint: _Endpoint, url: str) -> None:
+        for priority, name in PRIORITY_NAMES.items():
+            telemetry.set_gauge("llm_queue_depth", len(endpoint.waiters[priority]), endpoint=url, priority=name)
+            telemetry.set_gauge("llm_active_requests", endpoint.active[priority], endpoint=url, priority=name)
+    
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Active and queued requests per endpoint"""
+        return {
+            url: {
+                "limit": endpoint.limit,
+                **{f"active_{PRIORITY_NAMES[p]}": count for p, count in endpoint.active.items()},
+                **{f"queued_{PRIORITY_NAMES[p]}": len(waiters) for p, waiters in endpoint.waiters.items()}
+            }
+            for url, endpoint in self._endpoints.items()
+        }
+
+# Futures belong to one event loop, so each loop gets its own scheduler
+_schedulers: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, LLMScheduler]" = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+
+def get_scheduler() -> LLMScheduler:
+    """The LLM scheduler of the running event loop"""
+    loop = asyncio.get_running_loop()
+    with _lock:
+        scheduler = _schedulers.get(loop)
+        if scheduler is None:
+            scheduler = _schedulers[loop] = LLMScheduler(shared_slots=SharedSlots() if LLM_SHARED_SLOTS else None)
+        return scheduler
+
+def llm_slot(task: str, priority: Optional[int] = None, endpoint_url: str = OLLAMA_BASE_URL):
+    """Hold an LLM slot for a task, at the task's priority unless given"""
+    if priority is None:
+        priority = TASK_PRIORITIES.get(task, BACKGROUND)
+    return get_scheduler().slot(priority, endpoint_url)
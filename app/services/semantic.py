@@ -0,0 +1,269 @@
+# app/services/semantic.py
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Set
+
+import numpy as np
+from bson import Binary, ObjectId
+from pymongo import ASCENDING
+from pymongo.errors import BulkWriteError
+
+from app.config import (
+    SEMANTIC_EMBEDDER, SEMANTIC_MEMORY_TOP_K,
+    SEMANTIC_MEMORY_MIN_SCORE, SEMANTIC_INDEX_CACHE_SIZE, SEMANTIC_INDEX_BATCH_SIZE,
+    SEMANTIC_INDEX_REFRESH_OVERLAP_SECONDS
+)
+from app.services.database import get_async_database
+from app.services.history import AsyncMongoDBChatMessageHistory, SESSION_ID_KEY
+from app.services.llm import MODEL_ROUTES, EMBEDDING_TASK, get_embeddings
+from app.services.scheduler import INTERACTIVE, llm_slot
+
+# Longest text embedded per message; the start carries most of the topic
+MAX_EMBED_CHARS = 2000
+
+class HashingEmbedder:
+    """Local embedder using feature hashing of words and word pairs.
+    
+    Deterministic and free of model calls, so it suits tests and development;
+    it only captures lexical overlap.
+    """
+    
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+    
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        words = re.findall(r"\w+", text.lower())
+        for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+            digest = hashlib.blake2b(feature.encode(), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dim
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        return vector.tolist()
+    
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+    
+    async def aembed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+class OllamaEmbedder:
+    """Embeddings from Ollama's embedding endpoint"""
+    
+    def __init__(self, model: Optional[str] = None):
+        self.model = model or MODEL_ROUTES[EMBEDDING_TASK].model
+        self.name = f"ollama-{self.model}"
+    
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        async with llm_slot(EMBEDDING_TASK):
+            return await get_embeddings(self.model).aembed_documents(texts)
+    
+    async def aembed_query(self, text: str) -> List[float]:
+        # Queries are embedded while the student waits for a reply
+        async with llm_slot(EMBEDDING_TASK, INTERACTIVE):
+            return await get_embeddings(self.model).aembed_query(text)
+
+def get_embedder():
+    """Embedder selected by SEMANTIC_EMBEDDER"""
+    if SEMANTIC_EMBEDDER == "hashing":
+        return HashingEmbedder()
+    return OllamaEmbedder()
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+class _StudentIndex:
+    """In-memory vectors of one student's messages (rows are unit length)"""
+    
+    def __init__(self):
+        self.entries: List[Dict[str, Any]] = []
+        self.matrix: Optional[np.ndarray] = None
+        self.loaded_ids: Set[ObjectId] = set()
+        # Creation time of the newest loaded vector
+        self.newest: Optional[datetime] = None
+        self.lock = threading.Lock()
+    
+    def refresh_from(self, overlap_seconds: float) -> Optional[ObjectId]:
+        """Lowest _id a refresh must read: writers commit out of _id order, so
+        vectors created shortly before the newest loaded one may still be new"""
+        with self.lock:
+            if self.newest is None:
+                return None
+            return ObjectId.from_datetime(self.newest - timedelta(seconds=overlap_seconds))
+    
+    def extend(self, documents: List[Dict[str, Any]]) -> None:
+        with self.lock:
+            # Refreshes overlap, and another refresh may have added the same documents
+            documents = [doc for doc in documents if doc["_id"] not in self.loaded_ids]
+            if not documents:
+                return
+            vectors = _normalize(np.stack([
+                np.frombuffer(doc["vector"], dtype=np.float32) for doc in documents
+            ]))
+            self.matrix = vectors if self.matrix is None else np.vstack([self.matrix, vectors])
+            self.entries.extend({
+                "message_id": doc["message_id"],
+                "conversation_id": doc["conversation_id"],
+                "role": doc["role"],
+                "text": doc["text"]
+            } for doc in documents)
+            self.loaded_ids.update(doc["_id"] for doc in documents)
+            newest = max(doc["_id"].generation_time for doc in documents)
+            self.newest = newest if self.newest is None else max(self.newest, newest)
+    
+    def search(self, query: np.ndarray, k: int, min_score: float, exclude_ids: Set[str]) -> List[Dict[str, Any]]:
+        with self.lock:
+            if self.matrix is None or self.matrix.shape[1] != query.shape[0]:
+                return []
+            # Brute-force cosine similarity over all of the student's messages
+            scores = self.matrix @ query
+            entries = self.entries
+        
+        results = []
+        for index in np.argsort(-scores):
+            if scores[index] < min_score or len(results) >= k:
+                break
+            entry = entries[index]
+            if entry["message_id"] in exclude_ids:
+                continue
+            results.append({**entry, "score": float(scores[index])})
+        return results
+
+class SemanticMemory:
+    """Per-student vector index over stored messages.
+    
+    Vectors are persisted in MongoDB, so an index is loaded (not re-embedded)
+    the first time a student is searched in a process, and refreshed
+    incrementally with vectors added since.
+    """
+    
+    def __init__(self, embedder=None, collection_name: str = "message_embeddings",
+                 cache_size: int = SEMANTIC_INDEX_CACHE_SIZE):
+        self.embedder = embedder or get_embedder()
+        self.collection_name = collection_name
+        self.cache_size = cache_size
+        self._indexes: "OrderedDict[str, _StudentIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    @property
+    def vectors(self):
+        return get_async_database()[self.collection_name]
+    
+    async def run_index_job(self, job: Dict[str, Any]) -> None:
+        """Job handler: embed and store all messages queued for a student, in batches"""
+        student_id = job["key"]
+        message_ids = []
+        for item in job["items"]:
+            if "messages" in item:
+                # Items queued with the message texts by earlier versions
+                await self.index_messages(student_id, [
+                    {**message, "conversation_id": item["conversation_id"]} for message in item["messages"]
+                ])
+                continue
+            message_ids.extend(item["message_ids"])
+        
+        # Skip messages stored by an earlier attempt of this job
+        indexed = set(await self.vectors.distinct(
+            "message_id", {"student_id": student_id, "message_id": {"$in": message_ids}}
+        ))
+        pending = [message_id for message_id in message_ids if message_id not in indexed]
+        for start in range(0, len(pending), SEMANTIC_INDEX_BATCH_SIZE):
+            messages = await self._load_messages(pending[start:start + SEMANTIC_INDEX_BATCH_SIZE])
+            await self.index_messages(student_id, messages)
+    
+    async def _load_messages(self, message_ids: List[str]) -> List[Dict[str, Any]]:
+        """Stored chat messages by ID, as {id, role, text, conversation_id}"""
+        cursor = get_async_database().conversations.find(
+            {"_id": {"$in": [ObjectId(message_id) for message_id in message_ids]}}
+        )
+        documents = [document async for document in cursor]
+        messages = AsyncMongoDBChatMessageHistory._to_messages(documents)
+        return [
+            {
+                "id": message.id,
+                "role": message.type,
+                "text": message.content if isinstance(message.content, str) else str(message.content),
+                "conversation_id": document[SESSION_ID_KEY]
+            } for message, document in zip(messages, documents)
+        ]
+    
+    async def index_messages(self, student_id: str, messages: List[Dict[str, Any]]) -> int:
+        """Embed messages ({id, role, text, conversation_id}) and store their vectors"""
+        messages = [message for message in messages if message["text"].strip()]
+        if not messages:
+            return 0
+        
+        vectors = await self.embedder.aembed_documents(
+            [message["text"][:MAX_EMBED_CHARS] for message in messages]
+        )
+        now = datetime.now()
+        documents = [
+            {
+                "student_id": student_id,
+                "conversation_id": message["conversation_id"],
+                "message_id": message["id"],
+                "role": message["role"],
+                "text": message["text"],
+                "model": self.embedder.name,
+                "vector": Binary(np.asarray(vector, dtype=np.float32).tobytes()),
+                "created_at": now
+            } for message, vector in zip(messages, vectors)
+        ]
+        
+        try:
+            result = await self.vectors.insert_many(documents, ordered=False)
+            return len(result.inserted_ids)
+        except BulkWriteError as e:
+            # Messages indexed by an earlier attempt are skipped
+            if any(error["code"] != 11000 for error in e.details.get("writeErrors", [])):
+                raise
+            return e.details.get("nInserted", 0)
+    
+    async def search(self,
+                     student_id: str,
+                     query: str,
+                     k: int = SEMANTIC_MEMORY_TOP_K,
+                     exclude_ids: Optional[Set[str]] = None,
+                     min_score: float = SEMANTIC_MEMORY_MIN_SCORE) -> List[Dict[str, Any]]:
+        """Most similar stored messages of a student, best first"""
+        return await self.search_vector(student_id, await self.embed_query(query), k, exclude_ids, min_score)
+    
+    async def embed_query(self, query: str) -> np.ndarray:
+        """Normalized query vector, so it can be computed ahead of search_vector"""
+        return _normalize(np.asarray(await self.embedder.aembed_query(query[:MAX_EMBED_CHARS]), dtype=np.float32))
+    
+    async def search_vector(self,
+                            student_id: str,
+                            query_vector: np.ndarray,
+                            k: int = SEMANTIC_MEMORY_TOP_K,
+                            exclude_ids: Optional[Set[str]] = None,
+                            min_score: float = SEMANTIC_MEMORY_MIN_SCORE) -> List[Dict[str, Any]]:
+        """Like search, for a query embedded with embed_query. Excluded messages
+        don't count towards k, so pass the messages already in the prompt."""
+        index = await self._get_index(student_id)
+        if index.matrix is None:
+            return []
+        return index.search(query_vector, k, min_score, exclude_ids or set())
+    
+    async def _get_index(self, student_id: str) -> _StudentIndex:
+        """The student's in-memory index, brought up to date with stored vectors"""
+        with self._lock:
+            index = self._indexes.get(student_id)
+            if index is None:
+                index = self._indexes[student_id] = _StudentIndex()
+            self._indexes.move_to_end(student_id)
+            while len(self._indexes) > self.cache_size:
+                self._indexes.popitem(last=False)
+        
+        query: Dict[str, Any] = {"student_id": student_id, "model": self.embedder.name}
+        refresh_from = index.refresh_from(SEMANTIC_INDEX_REFRESH_OVERLAP_SECONDS)
+        if refresh_from is not None:
+            query["_id"] = {"$gte": refresh_from}
+        cursor = self.vectors.find(query).sort("_id", ASCENDING)
+        index.extend([document async for document in cursor])
+        return index
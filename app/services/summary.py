@@ -0,0 +1,97 @@
+# app/services/summary.py
+from typing import Any, Dict, List, Optional
+
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import PromptTemplate
+
+from app.config import SUMMARY_RECENT_MESSAGES, SUMMARY_MIN_BATCH, SUMMARY_MAX_BATCH
+from app.services.llm import SUMMARY_TASK, get_task_chain
+from app.services.memory import MemoryService
+from app.services.scheduler import llm_slot
+from app.utils.prompts import CONVERSATION_SUMMARY_PROMPT
+
+SUMMARY_PROMPT = PromptTemplate.from_template(CONVERSATION_SUMMARY_PROMPT)
+
+class SummaryService:
+    """Maintains a rolling summary of the messages that aged out of the recent window.
+    
+    The summary records the ID of the last message it covers, so every run
+    only folds in messages newer than that and nothing is summarized twice.
+    The window is the one the mentor's context assembler last used, so every
+    message is either in the prompt or in the summary.
+    """
+    
+    def __init__(self, memory_service: Optional[MemoryService] = None):
+        self.memory_service = memory_service or MemoryService()
+    
+    def _get_summary_chain(self):
+        """Get the compiled summarization chain"""
+        return get_task_chain(SUMMARY_TASK, lambda llm: SUMMARY_PROMPT | llm | StrOutputParser())
+    
+    async def run_summary_job(self, job: Dict[str, Any]) -> None:
+        """Job handler: bring the summary of a conversation up to date"""
+        # Message IDs grow over time, so the largest is the newest window start
+        window_starts = [item["window_start"] for item in job["items"] if item.get("window_start")]
+        await self.update_summary(job["key"], max(window_starts) if window_starts else None)
+    
+    async def update_summary(self, conversation_id: str, window_start: Optional[str] = None) -> bool:
+        """Fold messages older than window_start into the summary; returns True if updated.
+        
+        Without window_start the newest SUMMARY_RECENT_MESSAGES count as the
+        window, and messages are folded in once SUMMARY_MIN_BATCH aged out.
+        """
+        message_history = self.memory_service.get_message_history(conversation_id)
+        
+        # The oldest message still in the recent window bounds what may be summarized
+        if window_start is not None:
+            boundary_id = window_start
+            # These messages already left the prompt, so don't wait for a batch
+            min_batch = 1
+        else:
+            recent = await message_history.aget_tail(SUMMARY_RECENT_MESSAGES)
+            if len(recent) < SUMMARY_RECENT_MESSAGES:
+                return False
+            boundary_id = recent[0].id
+            min_batch = min(SUMMARY_MIN_BATCH, SUMMARY_MAX_BATCH)
+        
+        updated = False
+        while True:
+            summary = await self.memory_service.get_conversation_summary(conversation_id)
+            aged = await message_history.aget_range(
+                after=summary["through_id"],
+                before=boundary_id,
+                limit=SUMMARY_MAX_BATCH
+            )
+            to_summarize = [msg for msg in aged if not isinstance(msg, SystemMessage)]
+            
+            # Wait until enough messages aged out to be worth an LLM call
+            if not aged or len(aged) < min_batch:
+                return updated
+            
+            text = summary["text"]
+            if to_summarize:
+                async with llm_slot(SUMMARY_TASK):
+                    text = await self._get_summary_chain().ainvoke({
+                        "summary": text or "(no summary yet)",
+                        "messages": self._format_messages(to_summarize)
+                    })
+                text = text.strip()
+            
+            stored = await self.memory_service.update_conversation_summary(
+                conversation_id, text, aged[-1].id, summary["through_id"]
+            )
+            if not stored:
+                # A concurrent run advanced the summary, let it finish
+                return updated
+            updated = True
+            
+            if len(aged) < SUMMARY_MAX_BATCH:
+                return updated
+    
+    def _format_messages(self, messages: List[BaseMessage]) -> str:
+        """Render messages as a STUDENT/MENTOR transcript"""
+        return "\n".join(
+            f"{'STUDENT' if isinstance(msg, HumanMessage) else 'MENTOR'}: {msg.content}"
+            for msg in messages
+        )
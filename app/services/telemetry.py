@@ -0,0 +1,241 @@
+# app/services/telemetry.py
+import contextvars
+import json
+import logging
+import sys
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from app.config import TELEMETRY_ENABLED, TELEMETRY_JSON_LOGS, TELEMETRY_LOG_SPANS, DEBUG
+
+# Histogram buckets in seconds, from cache lookups to long generations
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Fields attached to every log event of the current turn or job
+_context: contextvars.ContextVar[Dict[str, Any]] = contextvars.ContextVar("telemetry_context", default={})
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+class _Histogram:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+    
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        return False
+
+_NOOP_SPAN = _NoopSpan()
+
+class _Span:
+    """Times a block; the duration goes to the span_duration_seconds histogram"""
+    
+    def __init__(self, telemetry: "Telemetry", name: str, labels: Dict[str, Any]):
+        self.telemetry = telemetry
+        self.name = name
+        self.labels = labels
+        self.duration: Optional[float] = None
+    
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self.start
+        status = "error" if exc_type else "ok"
+        self.telemetry.observe("span_duration_seconds", self.duration,
+                               span=self.name, status=status, **self.labels)
+        if TELEMETRY_LOG_SPANS:
+            self.telemetry.log("span", span=self.name, status=status,
+                               duration_ms=round(self.duration * 1000, 2), **self.labels)
+        return False
+
+class _JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        event = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname.lower(),
+            "event": record.getMessage()
+        }
+        event.update(getattr(record, "fields", {}))
+        return json.dumps(event, default=str)
+
+class _TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        fields = getattr(record, "fields", {})
+        details = " ".join(f"{name}={value}" for name, value in fields.items())
+        return f"[{record.levelname.lower()}] {record.getMessage()}" + (f" {details}" if details else "")
+
+class Telemetry:
+    """In-process counters, histograms and spans, plus structured log events"""
+    
+    def __init__(self, enabled: bool = TELEMETRY_ENABLED, json_logs: bool = TELEMETRY_JSON_LOGS):
+        self.enabled = enabled
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._gauges: Dict[str, Dict[LabelKey, float]] = {}
+        self._histograms: Dict[str, Dict[LabelKey, _Histogram]] = {}
+        self._help: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self.logger = logging.getLogger("horizon")
+        if not self.logger.handlers:
+            handler = logging.StreamHandler(sys.stdout)
+            handler.setFormatter(_JsonFormatter() if json_logs else _TextFormatter())
+            self.logger.addHandler(handler)
+            self.logger.setLevel(logging.DEBUG if DEBUG else logging.INFO)
+            self.logger.propagate = False
+    
+    def describe(self, name: str, help_text: str) -> None:
+        """Set the HELP text of a metric"""
+        self._help[name] = help_text
+    
+    def incr(self, name: str, value: float = 1, **labels: Any) -> None:
+        """Add to a counter"""
+        if not self.enabled:
+            return
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+    
+    def set_gauge(self, name: str, value: float, **labels: Any) -> None:
+        """Set a gauge to its current value"""
+        if not self.enabled:
+            return
+        key = _label_key(labels)
+        with self._lock:
+            self._gauges.setdefault(name, {})[key] = value
+    
+    def observe(self, name: str, value: float, **labels: Any) -> None:
+        """Record a value (in seconds for durations) in a histogram"""
+        if not self.enabled:
+            return
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = _Histogram(DEFAULT_BUCKETS)
+            histogram.observe(value)
+    
+    def span(self, name: str, **labels: Any):
+        """Context manager timing a block of work"""
+        if not self.enabled:
+            return _NOOP_SPAN
+        return _Span(self, name, labels)
+    
+    @contextmanager
+    def context(self, **fields: Any) -> Iterator[None]:
+        """Attach fields (e.g. conversation_id) to log events inside the block"""
+        token = _context.set({**_context.get(), **fields})
+        try:
+            yield
+        finally:
+            _context.reset(token)
+    
+    def log(self, event: str, level: str = "info", **fields: Any) -> None:
+        """Write a log event with the current context fields"""
+        log_level = getattr(logging, level.upper())
+        if not self.logger.isEnabledFor(log_level):
+            return
+        self.logger.log(log_level, event, extra={"fields": {**_context.get(), **fields}})
+    
+    def error(self, event: str, error: Optional[BaseException] = None, **fields: Any) -> None:
+        """Log an error event and count it in errors_total"""
+        self.incr("errors_total", event=event)
+        if error is not None:
+            fields["error"] = f"{type(error).__name__}: {error}"
+        self.log(event, level="error", **fields)
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """Counters and histogram summaries as plain data"""
+        with self._lock:
+            return {
+                "counters": {
+                    name: {",".join(f"{k}={v}" for k, v in key): value for key, value in series.items()}
+                    for name, series in self._counters.items()
+                },
+                "gauges": {
+                    name: {",".join(f"{k}={v}" for k, v in key): value for key, value in series.items()}
+                    for name, series in self._gauges.items()
+                },
+                "histograms": {
+                    name: {
+                        ",".join(f"{k}={v}" for k, v in key): {"count": h.count, "sum": round(h.sum, 6)}
+                        for key, h in series.items()
+                    }
+                    for name, series in self._histograms.items()
+                }
+            }
+    
+    def render_prometheus(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        lines: List[str] = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} counter")
+                for key, value in series.items():
+                    lines.append(f"{name}{_format_labels(key)} {value}")
+            for name, series in sorted(self._gauges.items()):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} gauge")
+                for key, value in series.items():
+                    lines.append(f"{name}{_format_labels(key)} {value}")
+            for name, series in sorted(self._histograms.items()):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} histogram")
+                for key, histogram in series.items():
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_format_labels(key, ('le', str(bound)))} {cumulative}")
+                    lines.append(f"{name}_bucket{_format_labels(key, ('le', '+Inf'))} {histogram.count}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {histogram.sum}")
+                    lines.append(f"{name}_count{_format_labels(key)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+# Shared by every service in the process
+telemetry = Telemetry()
+telemetry.describe("span_duration_seconds", "Duration of instrumented steps")
+telemetry.describe("errors_total", "Logged errors by event")
+telemetry.describe("prompt_estimated_tokens_total", "Estimated mentor prompt tokens")
+telemetry.describe("prompt_estimated_prefix_reused_tokens_total",
+                   "Estimated mentor prompt tokens shared with the conversation's previous prompt")
+telemetry.describe("llm_ttft_seconds", "Time to the first streamed token")
+telemetry.describe("cache_requests_total", "In-process cache lookups by result")
+telemetry.describe("extraction_runs_total", "Fact extraction runs by result")
+telemetry.describe("jobs_total", "Background jobs by kind and result")
+telemetry.describe("llm_queue_depth", "LLM requests waiting for a slot, by endpoint and priority")
+telemetry.describe("llm_active_requests", "LLM requests holding a slot, by endpoint and priority")
+telemetry.describe("llm_queue_wait_seconds", "Time LLM requests waited for a slot")
+telemetry.describe("llm_rejected_total", "LLM requests rejected by admission control, by reason")
+telemetry.describe("llm_calls_total", "LLM calls by task and serving model")
+telemetry.describe("llm_prompt_eval_tokens_total", "Prompt tokens evaluated by the model, by task and model")
+telemetry.describe("llm_completion_tokens_total", "Generated tokens by task and model")
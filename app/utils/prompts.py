@@ -24,4 +24,42 @@ When supporting mental wellbeing:
 Use the student profile information to personalize your responses. The more you learn about the student through conversation, the more tailored your guidance should become.
 
 Respond as a supportive, knowledgeable mentor focused on the student's success and wellbeing.
-"""
\ No newline at end of file
+"""
+
+MENTOR_HISTORY_INSTRUCTIONS = "IMPORTANT: You must reference previous parts of the conversation when relevant. You have full access to the conversation history."
+
+# Bump when FACT_EXTRACTION_PROMPT changes, so cached extraction results are not reused
+FACT_EXTRACTION_PROMPT_VERSION = 1
+
+FACT_EXTRACTION_PROMPT = """
+You are an AI assistant specialized in extracting structured facts about students from conversations.
+
+Based on the following conversation excerpt:
+
+{conversation}
+
+Please extract any facts about the student, considering these existing facts:
+{existing_facts}
+
+Extract facts in these categories:
+1. ACADEMIC: courses, study habits, academic performance, interests, challenges
+2. CAREER: goals, interests, skills, experiences, plans
+3. PERSONAL: preferences, challenges, support needs, wellbeing status
+
+For each fact, indicate if it's NEW, UPDATED, or a CONFIRMATION of existing information.
+
+{format_instructions}
+
+Include only definite facts, not speculations.
+"""
+CONVERSATION_SUMMARY_PROMPT = """
+You maintain a running summary of a long mentoring conversation between an AI mentor and an undergraduate student.
+
+Current summary of the earlier conversation:
+{summary}
+
+Newer messages that are no longer shown to the mentor:
+{messages}
+
+Write an updated summary that merges the new messages into the current summary. Keep the topics discussed, advice given, commitments and plans, how the student was feeling, and anything the mentor should follow up on. Drop small talk. Write in the third person, in plain prose, in under 250 words. Reply with the summary only.
+"""
@@ -0,0 +1,125 @@
+# benchmarks/fake_ollama.py
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+CHARS_PER_TOKEN = 4
+WORDS = "that is a great question and here is how you could approach it step by step".split()
+FACTS_RESPONSE = json.dumps({
+    "extracted_facts": [
+        {"category": "ACADEMIC", "key": "benchmark_topic", "value": "load testing",
+         "status": "CONFIRMATION", "confidence": 0.9}
+    ],
+    "contradictions": []
+})
+
+class FakeOllamaSettings:
+    """Simulated model timing"""
+    
+    def __init__(self,
+                 ttft_ms: float = 200.0,
+                 tokens_per_second: float = 50.0,
+                 response_tokens: int = 60,
+                 prefill_tokens_per_second: float = 0.0,
+                 embedding_dim: int = 256):
+        self.ttft_ms = ttft_ms
+        self.tokens_per_second = tokens_per_second
+        self.response_tokens = response_tokens
+        # When set, prompt evaluation adds prompt_tokens / rate to the TTFT
+        self.prefill_tokens_per_second = prefill_tokens_per_second
+        self.embedding_dim = embedding_dim
+
+def create_app(settings: FakeOllamaSettings) -> FastAPI:
+    """Stand-in for the Ollama endpoints the app uses (/api/generate, /api/embed)"""
+    app = FastAPI()
+    
+    def chunk(model: str, text: str, done: bool, **extra: Any) -> bytes:
+        return (json.dumps({
+            "model": model,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "response": text,
+            "done": done,
+            **extra
+        }) + "\n").encode()
+    
+    @app.post("/api/generate")
+    async def generate(request: Request):
+        body = await request.json()
+        model = body.get("model", "fake")
+        prompt = body.get("prompt", "")
+        prompt_tokens = max(1, len(prompt) // CHARS_PER_TOKEN)
+        
+        # Fact extraction prompts need parseable JSON back
+        if "extracting structured facts" in prompt:
+            pieces = [FACTS_RESPONSE[i:i + 16] for i in range(0, len(FACTS_RESPONSE), 16)]
+        else:
+            pieces = [WORDS[i % len(WORDS)] + " " for i in range(settings.response_tokens)]
+        
+        delay = settings.ttft_ms / 1000
+        if settings.prefill_tokens_per_second:
+            delay += prompt_tokens / settings.prefill_tokens_per_second
+        interval = 1 / settings.tokens_per_second if settings.tokens_per_second else 0
+        final = {
+            "done_reason": "stop",
+            "prompt_eval_count": prompt_tokens,
+            "eval_count": len(pieces),
+            "total_duration": 0
+        }
+        
+        if body.get("stream", True) is False:
+            await asyncio.sleep(delay + interval * len(pieces))
+            return JSONResponse(json.loads(chunk(model, "".join(pieces), True, **final)))
+        
+        async def stream():
+            await asyncio.sleep(delay)
+            for piece in pieces:
+                yield chunk(model, piece, False)
+                if interval:
+                    await asyncio.sleep(interval)
+            yield chunk(model, "", True, **final)
+        
+        return StreamingResponse(stream(), media_type="application/x-ndjson")
+    
+    @app.post("/api/embed")
+    async def embed(request: Request):
+        body = await request.json()
+        inputs = body.get("input", [])
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        embeddings = []
+        for text in inputs:
+            seed = hashlib.sha256(text.encode()).digest()
+            embeddings.append([(seed[i % len(seed)] - 128) / 128 for i in range(settings.embedding_dim)])
+        return {"model": body.get("model"), "embeddings": embeddings}
+    
+    return app
+
+class FakeOllamaServer:
+    """Runs the fake Ollama in a background thread"""
+    
+    def __init__(self, settings: FakeOllamaSettings, host: str = "127.0.0.1", port: int = 11500):
+        self.url = f"http://{host}:{port}"
+        self.server = uvicorn.Server(uvicorn.Config(
+            create_app(settings), host=host, port=port, log_level="warning", access_log=False
+        ))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+    
+    def start(self) -> None:
+        self.thread.start()
+        deadline = time.monotonic() + 10
+        while not self.server.started:
+            if time.monotonic() > deadline:
+                raise RuntimeError("Fake Ollama server did not start")
+            time.sleep(0.05)
+    
+    def stop(self) -> None:
+        self.server.should_exit = True
+        self.thread.join(timeout=5)
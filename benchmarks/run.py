@@ -0,0 +1,325 @@
+# benchmarks/run.py
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from pymongo import monitoring
+
+from benchmarks.fake_ollama import FakeOllamaServer, FakeOllamaSettings
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+FILLER = ("I have been working on my assignments for the data structures course and "
+          "I am not sure how to plan the rest of the semester around my internship search. ")
+
+class CommandCounter(monitoring.CommandListener):
+    """Counts MongoDB commands sent by the app's clients"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.commands: Counter = Counter()
+    
+    def started(self, event):
+        with self._lock:
+            self.commands[event.command_name] += 1
+    
+    def succeeded(self, event):
+        pass
+    
+    def failed(self, event):
+        pass
+    
+    def reset(self) -> Dict[str, int]:
+        """Counts since the last reset"""
+        with self._lock:
+            commands, self.commands = dict(self.commands), Counter()
+        return commands
+
+def summarize(values: List[float]) -> Dict[str, Optional[float]]:
+    """Mean and p50/p95/p99 of a sample"""
+    if not values:
+        return {"mean": None, "p50": None, "p95": None, "p99": None}
+    ordered = sorted(values)
+    def percentile(q):
+        return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+    return {
+        "mean": round(statistics.fmean(ordered), 3),
+        "p50": round(percentile(0.50), 3),
+        "p95": round(percentile(0.95), 3),
+        "p99": round(percentile(0.99), 3)
+    }
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+async def seed_students(memory_service, count: int, history_length: int, run_id: str) -> List[Dict[str, str]]:
+    """Create students whose conversations already hold history_length messages"""
+    from langchain_core.messages import AIMessage, HumanMessage
+    from app.models.student import Student
+    
+    users = []
+    for index in range(count):
+        student_id = await memory_service.create_student(Student(
+            name=f"Benchmark Student {index}",
+            email=f"bench-{run_id}-{history_length}-{index}@example.com",
+            university="Benchmark University",
+            program="Computer Science",
+            year=2
+        ))
+        conversation_id = await memory_service.get_or_create_student_conversation(student_id)
+        if history_length:
+            await memory_service.get_message_history(conversation_id).aadd_messages([
+                (HumanMessage if turn % 2 == 0 else AIMessage)(content=f"[{turn}] " + FILLER)
+                for turn in range(history_length)
+            ])
+        users.append({"student_id": student_id, "conversation_id": conversation_id})
+    return users
+
+async def mentor_user(user: Dict[str, str], turns: int, samples: Dict[str, list]) -> None:
+    """One simulated student sending turns sequentially"""
+    from app.services.mentor import MentorService
+    
+    mentor = MentorService()
+    for turn in range(turns):
+        message = f"Turn {turn}: I am a second year student and I struggle with exams. " + FILLER
+        start = time.perf_counter()
+        first_token = None
+        tokens = 0
+        async for token in mentor.respond_to_student(user["student_id"], message, user["conversation_id"]):
+            if token.startswith("<CONVERSATION_ID>"):
+                continue
+            if first_token is None:
+                first_token = time.perf_counter()
+            tokens += 1
+        end = time.perf_counter()
+        
+        samples["latency_ms"].append((end - start) * 1000)
+        if first_token is not None:
+            samples["ttft_ms"].append((first_token - start) * 1000)
+            if end > first_token:
+                samples["tokens_per_second"].append(tokens / (end - first_token))
+        stats = mentor.last_prompt_stats
+        if stats is not None:
+            samples["prompt_tokens"].append(stats.prompt_tokens)
+            samples["prefix_reused_tokens"].append(stats.prefix_reused_tokens)
+            if stats.evaluated_tokens is not None:
+                samples["evaluated_tokens"].append(stats.evaluated_tokens)
+
+async def bench_mentor(memory_service, counter: CommandCounter, concurrency: int,
+                       history_length: int, turns: int, run_id: str) -> Dict[str, Any]:
+    users = await seed_students(memory_service, concurrency, history_length, run_id)
+    samples = {key: [] for key in ("latency_ms", "ttft_ms", "tokens_per_second",
+                                   "prompt_tokens", "prefix_reused_tokens", "evaluated_tokens")}
+    
+    counter.reset()
+    start = time.perf_counter()
+    await asyncio.gather(*(mentor_user(user, turns, samples) for user in users))
+    elapsed = time.perf_counter() - start
+    commands = counter.reset()
+    
+    total_turns = concurrency * turns
+    return {
+        "scenario": "mentor",
+        "concurrency": concurrency,
+        "history_length": history_length,
+        "turns": total_turns,
+        "turns_per_second": round(total_turns / elapsed, 3),
+        "latency_ms": summarize(samples["latency_ms"]),
+        "ttft_ms": summarize(samples["ttft_ms"]),
+        "tokens_per_second": summarize(samples["tokens_per_second"]),
+        # Estimates (chars / 4)
+        "prompt_tokens": summarize(samples["prompt_tokens"]),
+        "prefix_reused_tokens": summarize(samples["prefix_reused_tokens"]),
+        # Measured by the (fake) Ollama server
+        "evaluated_prompt_tokens": summarize(samples["evaluated_tokens"]),
+        "mongo_ops_per_turn": round(sum(commands.values()) / total_turns, 2),
+        "mongo_ops_by_command": commands
+    }
+
+async def bench_extraction(memory_service, counter: CommandCounter, concurrency: int,
+                           turns: int, run_id: str) -> Dict[str, Any]:
+    from app.services.intelligence import IntelligenceService
+    
+    users = await seed_students(memory_service, concurrency, 0, f"{run_id}-x")
+    intelligence = IntelligenceService(memory_service=memory_service)
+    latencies: List[float] = []
+    
+    async def extract(user):
+        for turn in range(turns):
+            # Distinct inputs, so the extraction cache does not short-circuit the LLM
+            message = f"[{uuid.uuid4().hex}] My goal is to get a data science internship. " + FILLER
+            start = time.perf_counter()
+            await intelligence.extract_facts(user["student_id"], user["conversation_id"], message, "Good plan.")
+            latencies.append((time.perf_counter() - start) * 1000)
+    
+    counter.reset()
+    start = time.perf_counter()
+    await asyncio.gather(*(extract(user) for user in users))
+    elapsed = time.perf_counter() - start
+    commands = counter.reset()
+    
+    total_turns = concurrency * turns
+    return {
+        "scenario": "extraction",
+        "concurrency": concurrency,
+        "history_length": 0,
+        "turns": total_turns,
+        "turns_per_second": round(total_turns / elapsed, 3),
+        "latency_ms": summarize(latencies),
+        "mongo_ops_per_turn": round(sum(commands.values()) / total_turns, 2),
+        "mongo_ops_by_command": commands
+    }
+
+async def run_benchmarks(args, counter: CommandCounter) -> List[Dict[str, Any]]:
+    from app.config import MONGODB_DB
+    from app.services.database import get_async_client, close_async_client
+    from app.services.memory import MemoryService
+    
+    memory_service = MemoryService()
+    run_id = uuid.uuid4().hex[:8]
+    results = []
+    try:
+        for concurrency in args.concurrency:
+            if "mentor" in args.scenarios:
+                for history_length in args.history:
+                    result = await bench_mentor(memory_service, counter, concurrency,
+                                                history_length, args.turns, run_id)
+                    print_result(result)
+                    results.append(result)
+            if "extraction" in args.scenarios:
+                result = await bench_extraction(memory_service, counter, concurrency, args.turns, run_id)
+                print_result(result)
+                results.append(result)
+    finally:
+        if not args.keep_data:
+            await get_async_client().drop_database(MONGODB_DB)
+        await close_async_client()
+    return results
+
+def print_result(result: Dict[str, Any]) -> None:
+    ttft = result.get("ttft_ms", {}).get("p50")
+    print(f"{result['scenario']:<10} c={result['concurrency']:<3} h={result['history_length']:<4} "
+          f"p50={result['latency_ms']['p50']}ms p95={result['latency_ms']['p95']}ms "
+          f"p99={result['latency_ms']['p99']}ms ttft_p50={ttft}ms "
+          f"mongo_ops/turn={result['mongo_ops_per_turn']}")
+
+def compare(results: List[Dict[str, Any]], baseline_path: str) -> None:
+    """Print latency changes against an earlier results file"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    previous = {(r["scenario"], r["concurrency"], r["history_length"]): r for r in baseline["results"]}
+    print(f"\nCompared to {baseline['commit']} ({baseline_path}):")
+    for result in results:
+        before = previous.get((result["scenario"], result["concurrency"], result["history_length"]))
+        if before is None:
+            continue
+        changes = []
+        for metric in ("latency_ms", "ttft_ms"):
+            for stat in ("p50", "p95"):
+                old = before.get(metric, {}).get(stat)
+                new = result.get(metric, {}).get(stat)
+                if old and new is not None:
+                    changes.append(f"{metric}.{stat} {(new - old) / old:+.1%}")
+        changes.append(f"mongo_ops/turn {before['mongo_ops_per_turn']} -> {result['mongo_ops_per_turn']}")
+        print(f"  {result['scenario']} c={result['concurrency']} h={result['history_length']}: {', '.join(changes)}")
+
+def parse_list(value: str) -> List[int]:
+    return [int(item) for item in value.split(",") if item]
+
+def main():
+    """Benchmark mentor turns and fact extraction against a fake Ollama and a local MongoDB"""
+    parser = argparse.ArgumentParser(description="Run the end-to-end benchmarks")
+    parser.add_argument("--scenarios", default="mentor,extraction", help="Comma-separated: mentor, extraction")
+    parser.add_argument("--concurrency", type=parse_list, default=[1, 4, 16], help="e.g. 1,4,16")
+    parser.add_argument("--history", type=parse_list, default=[0, 20, 100], help="Seeded messages, e.g. 0,20,100")
+    parser.add_argument("--turns", type=int, default=5, help="Turns per simulated student")
+    parser.add_argument("--mongodb-uri", default=os.getenv("MONGODB_URI", "mongodb://localhost:27017/"))
+    parser.add_argument("--mongodb-db", default="horizon_benchmark", help="Dropped after the run")
+    parser.add_argument("--in-memory-mongo", action="store_true",
+                        help="Start a throwaway mongod with pymongo_inmemory (must be installed)")
+    parser.add_argument("--keep-data", action="store_true", help="Do not drop the benchmark database")
+    parser.add_argument("--ollama-port", type=int, default=11500)
+    parser.add_argument("--ttft-ms", type=float, default=200.0)
+    parser.add_argument("--tokens-per-second", type=float, default=50.0)
+    parser.add_argument("--response-tokens", type=int, default=60)
+    parser.add_argument("--prefill-tokens-per-second", type=float, default=0.0,
+                        help="Add prompt_tokens / rate to the TTFT (0 disables)")
+    parser.add_argument("--output", help="Results file (default: benchmarks/results/<time>_<commit>.json)")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    args = parser.parse_args()
+    args.scenarios = set(args.scenarios.split(","))
+    
+    mongod = None
+    if args.in_memory_mongo:
+        try:
+            from pymongo_inmemory import Mongod
+        except ImportError:
+            parser.error("--in-memory-mongo needs the pymongo_inmemory package")
+        mongod = Mongod()
+        mongod.start()
+        args.mongodb_uri = mongod.connection_string
+    
+    settings = FakeOllamaSettings(
+        ttft_ms=args.ttft_ms,
+        tokens_per_second=args.tokens_per_second,
+        response_tokens=args.response_tokens,
+        prefill_tokens_per_second=args.prefill_tokens_per_second
+    )
+    server = FakeOllamaServer(settings, port=args.ollama_port)
+    server.start()
+    
+    # app.config reads the environment on import, so set it before importing the app
+    os.environ["MONGODB_URI"] = args.mongodb_uri
+    os.environ["MONGODB_DB"] = args.mongodb_db
+    os.environ["OLLAMA_BASE_URL"] = server.url
+    from app.services.database import add_event_listener
+    from app.services.indexes import ensure_indexes
+    
+    counter = CommandCounter()
+    add_event_listener(counter)
+    try:
+        ensure_indexes()
+        results = asyncio.run(run_benchmarks(args, counter))
+    finally:
+        server.stop()
+        if mongod is not None:
+            mongod.stop()
+    
+    commit = git_commit()
+    report = {
+        "commit": commit,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "settings": {
+            "turns": args.turns,
+            "ttft_ms": args.ttft_ms,
+            "tokens_per_second": args.tokens_per_second,
+            "response_tokens": args.response_tokens,
+            "prefill_tokens_per_second": args.prefill_tokens_per_second
+        },
+        "results": results
+    }
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}_{commit}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {output}")
+    
+    if args.compare:
+        compare(results, args.compare)
+
+if __name__ == "__main__":
+    main()
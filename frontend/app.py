@@ -299,9 +299,9 @@ st.set_page_config(
     layout="wide"
 )
 
-import asyncio
 import sys
 import os
+import time
 from datetime import datetime
 import json
 from bson.objectid import ObjectId  # Add this import
@@ -311,20 +311,35 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 
 from app.services.mentor import MentorService
 from app.services.memory import MemoryService
+from app.services.auth import hash_password, verify_password
+from app.services.database import get_sync_database
+from app.services.indexes import ensure_indexes
+from app.services.fact_gate import fact_gate
+from app.services.telemetry import telemetry
+from app.services.runtime import get_runtime
+from app.config import MONGODB_ENSURE_INDEXES, CHAT_PAGE_SIZE, STREAM_FLUSH_INTERVAL_MS, STREAM_FLUSH_TOKENS
 from app.models.student import Student
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
 
 # Initialize services - ONLY ONCE at the module level
 @st.cache_resource
 def get_services():
+    if MONGODB_ENSURE_INDEXES:
+        result = ensure_indexes()
+        for collection_name, error in result["errors"].items():
+            telemetry.error("indexes.ensure_failed", collection=collection_name, detail=error)
     return {
         "memory_service": MemoryService(),
-        "mentor_service": MentorService()
+        "mentor_service": MentorService(),
+        # One event loop for all async calls, kept across reruns so pooled
+        # connections and background tasks survive
+        "runtime": get_runtime()
     }
 
 services = get_services()
 memory_service = services["memory_service"]
 mentor_service = services["mentor_service"]
+runtime = services["runtime"]
 
 # Session state initialization
 if "student_id" not in st.session_state:
@@ -333,6 +348,16 @@ if "conversation_id" not in st.session_state:
     st.session_state.conversation_id = None
 if "messages" not in st.session_state:
     st.session_state.messages = []
+if "history_loaded" not in st.session_state:
+    st.session_state.history_loaded = False
+# Only the last visible_limit messages are rendered on each rerun
+if "visible_limit" not in st.session_state:
+    st.session_state.visible_limit = CHAT_PAGE_SIZE
+# ID of the oldest loaded message; older pages are read before it
+if "older_cursor" not in st.session_state:
+    st.session_state.older_cursor = None
+if "history_exhausted" not in st.session_state:
+    st.session_state.history_exhausted = False
 if "debug" not in st.session_state:
     st.session_state.debug = True  # Enable debug by default
 
@@ -357,7 +382,10 @@ async def get_student_data(student_id):
 
 # Login function - separate function to avoid multiple reruns
 def handle_login(email, password):
-    student = asyncio.run(memory_service.get_student_by_email(email))
+    student = runtime.run(memory_service.get_student_by_email(email))
+    # Students registered without a password still log in by email
+    if student and student.get("password_hash") and not verify_password(password, student["password_hash"]):
+        return False
     if student:
         st.session_state.student_id = str(student["_id"])  # Ensure ID is a string
         st.session_state.student_name = student.get("name", "Student")  # Cache name
@@ -376,29 +404,44 @@ def handle_registration(name, email, university, program, year, password):
         year=year if isinstance(year, int) else None
     )
     
-    student_id = asyncio.run(memory_service.create_student(student))
+    password_hash = hash_password(password) if password else None
+    student_id = runtime.run(memory_service.create_student(student, password_hash=password_hash))
     st.session_state.student_id = student_id
     st.session_state.student_name = name  # Cache name
     st.session_state.student_email = email  # Cache email
     st.session_state.logged_in = True
     return True
 
-# Function to load conversation history
-def load_conversation_history(student_id):
-    # Get the student's conversation using the get_or_create method
-    conversation_id = asyncio.run(
-        memory_service.get_or_create_student_conversation(student_id)
-    )
-    
-    # Store the conversation ID in session state
-    st.session_state.conversation_id = conversation_id
+# Buffers streamed tokens and redraws the placeholder at a limited rate, since
+# every redraw re-sends and re-parses the whole reply so far
+class ThrottledMarkdown:
+    def __init__(self, placeholder, interval_ms=STREAM_FLUSH_INTERVAL_MS, max_tokens=STREAM_FLUSH_TOKENS):
+        self.placeholder = placeholder
+        self.interval = interval_ms / 1000
+        self.max_tokens = max_tokens
+        self.parts = []
+        self.pending = 0
+        self.last_flush = 0.0
     
-    # Get message history
-    message_history = memory_service.get_message_history(conversation_id)
+    def append(self, token):
+        self.parts.append(token)
+        self.pending += 1
+        if self.pending >= self.max_tokens or time.monotonic() - self.last_flush >= self.interval:
+            self.flush(cursor=True)
     
-    # Convert to format for session state
+    def flush(self, cursor=False):
+        text = "".join(self.parts)
+        # Keep the joined text so the next flush does not join every token again
+        self.parts = [text]
+        self.placeholder.markdown(text + ("▌" if cursor else ""))
+        self.pending = 0
+        self.last_flush = time.monotonic()
+        return text
+
+# Convert stored messages to the format kept in session state
+def to_ui_messages(history):
     messages = []
-    for msg in message_history.messages:
+    for msg in history:
         # Skip system messages in the UI display
         if isinstance(msg, SystemMessage):
             continue
@@ -411,11 +454,48 @@ def load_conversation_history(student_id):
             
         # Add to messages list
         messages.append({
+            "id": msg.id,
             "role": role,
             "content": msg.content
         })
     
-    return messages, conversation_id
+    return messages
+
+# Function to load the most recent page of the conversation history
+def load_conversation_history(student_id):
+    # Get the student's conversation using the get_or_create method
+    conversation_id = runtime.run(
+        memory_service.get_or_create_student_conversation(student_id)
+    )
+    
+    # Store the conversation ID in session state
+    st.session_state.conversation_id = conversation_id
+    
+    # Get the last page of the message history
+    message_history = memory_service.get_message_history(conversation_id)
+    history = runtime.run(message_history.aget_tail(CHAT_PAGE_SIZE))
+    
+    st.session_state.older_cursor = history[0].id if history else None
+    st.session_state.history_exhausted = len(history) < CHAT_PAGE_SIZE
+    st.session_state.visible_limit = CHAT_PAGE_SIZE
+    st.session_state.history_loaded = True
+    
+    return to_ui_messages(history), conversation_id
+
+# Function to show one more page of older messages
+def load_older_messages():
+    hidden = len(st.session_state.messages) - st.session_state.visible_limit
+    if hidden < CHAT_PAGE_SIZE and not st.session_state.history_exhausted:
+        # Not enough loaded yet, read the page before the oldest loaded message
+        message_history = memory_service.get_message_history(st.session_state.conversation_id)
+        history = runtime.run(message_history.aget_tail(
+            CHAT_PAGE_SIZE, before=st.session_state.older_cursor
+        ))
+        if history:
+            st.session_state.older_cursor = history[0].id
+        st.session_state.history_exhausted = len(history) < CHAT_PAGE_SIZE
+        st.session_state.messages = to_ui_messages(history) + st.session_state.messages
+    st.session_state.visible_limit += CHAT_PAGE_SIZE
 
 # Main application logic
 if not st.session_state.student_id:
@@ -449,15 +529,15 @@ if not st.session_state.student_id:
                 if handle_registration(name, email, university, program, year, password):
                     st.success("Account created successfully!")
 else:
-    # If user is logged in but has no messages yet, load them
-    if len(st.session_state.messages) == 0:
+    # If user is logged in but the history is not loaded yet, load its last page
+    if not st.session_state.history_loaded:
         try:
             st.session_state.messages, conversation_id = load_conversation_history(st.session_state.student_id)
         except Exception as e:
             st.error(f"Error loading conversation history: {str(e)}")
     
     # Retrieve student data using the safer function
-    student = asyncio.run(get_student_data(st.session_state.student_id))
+    student = runtime.run(get_student_data(st.session_state.student_id))
     
     # Layout with two columns
     col1, col2 = st.columns([3, 1])
@@ -469,8 +549,15 @@ else:
         student_name = student.get("name", "") if student else st.session_state.get("student_name", "Student")
         st.write(f"Welcome back, {student_name}!")
         
-        # Display chat messages
-        for message in st.session_state.messages:
+        # Display only the most recent messages, so a rerun costs the same
+        # however long the conversation is
+        visible_messages = st.session_state.messages[-st.session_state.visible_limit:]
+        has_older = (len(visible_messages) < len(st.session_state.messages)
+                     or not st.session_state.history_exhausted)
+        if has_older:
+            st.button("Load older messages", on_click=load_older_messages)
+        
+        for message in visible_messages:
             with st.chat_message(message["role"]):
                 st.markdown(message["content"])
         
@@ -489,31 +576,30 @@ else:
                 message_placeholder = st.empty()
                 
                 # Call mentor service to get response
-                async def get_response():
-                    full_text = ""
+                def get_response():
+                    renderer = ThrottledMarkdown(message_placeholder)
                     conversation_id = st.session_state.conversation_id
                     
-                    # Get streaming response
-                    async for response_chunk in mentor_service.respond_to_student(
+                    # Stream the response from the runtime loop as it is generated
+                    for response_chunk in runtime.stream(mentor_service.respond_to_student(
                         st.session_state.student_id,
                         prompt,
                         conversation_id
-                    ):
+                    )):
                         # Check if this is our special end token with conversation ID
                         if response_chunk.startswith("<CONVERSATION_ID>"):
                             # Extract conversation ID
                             conv_id = response_chunk.replace("<CONVERSATION_ID>", "").replace("</CONVERSATION_ID>", "")
                             st.session_state.conversation_id = conv_id
                         else:
-                            # Regular token
-                            full_text += response_chunk
-                            message_placeholder.markdown(full_text + "▌")
+                            # Regular token, shown with the next flush
+                            renderer.append(response_chunk)
                     
-                    message_placeholder.markdown(full_text)
-                    return full_text
+                    # Final render without the cursor
+                    return renderer.flush()
                 
-                # Run asynchronous code and get the full response
-                full_response = asyncio.run(get_response())
+                # Get the full response
+                full_response = get_response()
                 
                 # Add assistant response to chat history
                 st.session_state.messages.append({"role": "assistant", "content": full_response})
@@ -544,6 +630,9 @@ else:
                 st.write(f"Conversation ID: {st.session_state.conversation_id}")
                 st.write(f"Student ID: {st.session_state.student_id}")
                 st.write(f"UI Message count: {len(st.session_state.messages)}")
+                st.write(f"Student cache: {memory_service.cache_stats()}")
+                st.write(f"Fact extraction gate: {fact_gate.stats()}")
+                st.json(telemetry.snapshot(), expanded=False)
                 
                 # Add debug info about student retrieval
                 if student:
@@ -554,10 +643,7 @@ else:
                 
                 # Verify the conversation exists directly in MongoDB
                 try:
-                    from pymongo import MongoClient
-                    from app.config import MONGODB_URI, MONGODB_DB
-                    client = MongoClient(MONGODB_URI)
-                    db = client[MONGODB_DB]
+                    db = get_sync_database()
                     
                     # Check if the student exists by ID
                     try:
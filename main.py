@@ -3,8 +3,13 @@ import subprocess
 import os
 import sys
 
+from app.config import RUN_EXTRACTION_WORKER
+
 def main():
-    """Run the Streamlit app"""
+    """Run the Streamlit app (and the background extraction worker)"""
+    worker = None
+    if RUN_EXTRACTION_WORKER:
+        worker = subprocess.Popen([sys.executable, "worker.py"])
     try:
         subprocess.run([
             "streamlit", "run", 
@@ -13,6 +18,10 @@ def main():
     except subprocess.CalledProcessError as e:
         print(f"Error running Streamlit app: {e}")
         sys.exit(1)
+    finally:
+        if worker is not None:
+            worker.terminate()
+            worker.wait()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,41 @@
+# migrate.py
+import argparse
+import sys
+
+from app.services.fact_history import compact_legacy_facts
+from app.services.indexes import ensure_indexes, check_indexes
+
+def main():
+    """Create declared MongoDB indexes and report on index health"""
+    parser = argparse.ArgumentParser(description="Manage MongoDB indexes")
+    parser.add_argument("--check", action="store_true", help="Only report, do not create indexes")
+    parser.add_argument("--compact-facts", action="store_true",
+                        help="Fold the legacy facts log into fact_history")
+    args = parser.parse_args()
+    
+    if args.compact_facts:
+        stats = compact_legacy_facts()
+        print(f"facts: compacted {stats['records']} records into {stats['facts']} facts "
+              f"for {stats['students']} students")
+    
+    if not args.check:
+        result = ensure_indexes()
+        for collection_name, names in result["created"].items():
+            print(f"{collection_name}: ensured {', '.join(names)}")
+        for collection_name, error in result["errors"].items():
+            print(f"{collection_name}: ERROR {error}")
+    
+    report = check_indexes()
+    for collection_name, status in report.items():
+        for kind in ("missing", "unmanaged", "unused"):
+            if status[kind]:
+                print(f"{collection_name}: {kind} {', '.join(status[kind])}")
+    
+    if args.check:
+        if any(status["missing"] for status in report.values()):
+            sys.exit(1)
+    elif result["errors"]:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+# serve.py
+import argparse
+
+import uvicorn
+
+from app.config import API_HOST, API_PORT, API_WORKERS, DEBUG
+
+def main():
+    """Serve the mentor API with uvicorn worker processes"""
+    parser = argparse.ArgumentParser(description="Run the mentor API")
+    parser.add_argument("--host", default=API_HOST)
+    parser.add_argument("--port", type=int, default=API_PORT)
+    parser.add_argument("--workers", type=int, default=API_WORKERS,
+                        help="Worker processes, each with its own event loop and connection pools")
+    args = parser.parse_args()
+    
+    uvicorn.run(
+        "app.api:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        log_level="debug" if DEBUG else "info"
+    )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+# tests/test_scheduler.py
+import asyncio
+import copy
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from pymongo.errors import BulkWriteError
+
+from app.services.scheduler import (
+    BACKGROUND, INTERACTIVE, LLMQueueFull, LLMQueueTimeout, LLMScheduler, SharedSlots
+)
+
+URL = "http://ollama.test"
+
+def make_scheduler(limit: int = 1, reserved_slots: int = 0, max_queue: int = 10, timeout: float = 5.0) -> LLMScheduler:
+    return LLMScheduler(
+        default_limit=limit,
+        endpoint_limits={},
+        reserved_slots=reserved_slots,
+        max_queue={INTERACTIVE: max_queue, BACKGROUND: max_queue},
+        timeouts={INTERACTIVE: timeout, BACKGROUND: timeout}
+    )
+
+async def settle() -> None:
+    """Let the tasks started so far run up to their next wait"""
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+class SchedulerTest(unittest.IsolatedAsyncioTestCase):
+    """Admission control of one process (shared slots disabled)"""
+    
+    async def hold(self, scheduler: LLMScheduler, priority: int):
+        """Take a slot and return the context to leave it with"""
+        slot = scheduler.slot(priority, URL)
+        await slot.__aenter__()
+        return slot
+    
+    def start(self, scheduler: LLMScheduler, priority: int, started: list, label: str,
+              release: asyncio.Event) -> asyncio.Task:
+        async def run():
+            async with scheduler.slot(priority, URL):
+                started.append(label)
+                await release.wait()
+        return asyncio.create_task(run())
+    
+    async def test_interactive_waiters_go_first(self):
+        scheduler = make_scheduler()
+        holder = await self.hold(scheduler, BACKGROUND)
+        started, release = [], asyncio.Event()
+        tasks = [
+            self.start(scheduler, BACKGROUND, started, "background-1", release),
+            self.start(scheduler, BACKGROUND, started, "background-2", release),
+            self.start(scheduler, INTERACTIVE, started, "interactive", release),
+        ]
+        await settle()
+        self.assertEqual(scheduler.stats()[URL]["queued_background"], 2)
+        self.assertEqual(scheduler.stats()[URL]["queued_interactive"], 1)
+        
+        await holder.__aexit__(None, None, None)
+        release.set()
+        await asyncio.gather(*tasks)
+        self.assertEqual(started, ["interactive", "background-1", "background-2"])
+    
+    async def test_background_leaves_reserved_slots(self):
+        scheduler = make_scheduler(limit=2, reserved_slots=1)
+        holder = await self.hold(scheduler, BACKGROUND)
+        started, release = [], asyncio.Event()
+        background = self.start(scheduler, BACKGROUND, started, "background", release)
+        interactive = self.start(scheduler, INTERACTIVE, started, "interactive", release)
+        await settle()
+        self.assertEqual(started, ["interactive"])
+        
+        await holder.__aexit__(None, None, None)
+        release.set()
+        await asyncio.gather(background, interactive)
+        self.assertEqual(started, ["interactive", "background"])
+    
+    async def test_background_keeps_one_slot_when_all_are_reserved(self):
+        scheduler = make_scheduler(limit=1, reserved_slots=1)
+        async with scheduler.slot(BACKGROUND, URL):
+            self.assertEqual(scheduler.stats()[URL]["active_background"], 1)
+    
+    async def test_wait_times_out(self):
+        scheduler = make_scheduler(timeout=0.05)
+        holder = await self.hold(scheduler, INTERACTIVE)
+        with self.assertRaises(LLMQueueTimeout):
+            async with scheduler.slot(INTERACTIVE, URL):
+                pass
+        self.assertEqual(scheduler.stats()[URL]["queued_interactive"], 0)
+        
+        await holder.__aexit__(None, None, None)
+        self.assertEqual(scheduler.stats()[URL]["active_interactive"], 0)
+    
+    async def test_cancelled_waiter_leaves_the_queue(self):
+        scheduler = make_scheduler()
+        holder = await self.hold(scheduler, INTERACTIVE)
+        started, release = [], asyncio.Event()
+        cancelled = self.start(scheduler, INTERACTIVE, started, "cancelled", release)
+        waiting = self.start(scheduler, INTERACTIVE, started, "waiting", release)
+        await settle()
+        cancelled.cancel()
+        await settle()
+        self.assertTrue(cancelled.cancelled())
+        self.assertEqual(scheduler.stats()[URL]["queued_interactive"], 1)
+        
+        await holder.__aexit__(None, None, None)
+        release.set()
+        await waiting
+        self.assertEqual(started, ["waiting"])
+        self.assertEqual(scheduler.stats()[URL]["active_interactive"], 0)
+    
+    async def test_slot_handed_to_a_cancelled_waiter_is_passed_on(self):
+        scheduler = make_scheduler()
+        holder = await self.hold(scheduler, INTERACTIVE)
+        started, release = [], asyncio.Event()
+        cancelled = self.start(scheduler, INTERACTIVE, started, "cancelled", release)
+        waiting = self.start(scheduler, INTERACTIVE, started, "waiting", release)
+        await settle()
+        # The slot goes to the first waiter, which is cancelled before it resumes
+        await holder.__aexit__(None, None, None)
+        cancelled.cancel()
+        release.set()
+        await waiting
+        self.assertTrue(cancelled.cancelled())
+        self.assertEqual(started, ["waiting"])
+        self.assertEqual(scheduler.stats()[URL]["active_interactive"], 0)
+    
+    async def test_full_queue_rejects(self):
+        scheduler = make_scheduler(max_queue=1)
+        holder = await self.hold(scheduler, BACKGROUND)
+        started, release = [], asyncio.Event()
+        queued = self.start(scheduler, BACKGROUND, started, "queued", release)
+        await settle()
+        with self.assertRaises(LLMQueueFull):
+            async with scheduler.slot(BACKGROUND, URL):
+                pass
+        
+        await holder.__aexit__(None, None, None)
+        release.set()
+        await queued
+        self.assertEqual(started, ["queued"])
+
+class FakeSlotCollection:
+    """In-memory stand-in for the llm_slots collection, covering the queries SharedSlots makes"""
+    
+    def __init__(self):
+        self.documents = {}
+    
+    def _matches(self, document, query) -> bool:
+        for field, condition in query.items():
+            if field == "$or":
+                if not any(self._matches(document, option) for option in condition):
+                    return False
+                continue
+            value = document.get(field)
+            if isinstance(condition, dict):
+                for operator, operand in condition.items():
+                    if value is None:
+                        return False
+                    if operator == "$lt" and not value < operand:
+                        return False
+                    if operator == "$lte" and not value <= operand:
+                        return False
+                    if operator == "$gt" and not value > operand:
+                        return False
+            elif value != condition:
+                return False
+        return True
+    
+    async def insert_many(self, documents, ordered=True):
+        errors = []
+        for index, document in enumerate(documents):
+            if document["_id"] in self.documents:
+                errors.append({"index": index, "code": 11000})
+            else:
+                self.documents[document["_id"]] = copy.deepcopy(document)
+        if errors:
+            raise BulkWriteError({"writeErrors": errors, "nInserted": len(documents) - len(errors)})
+    
+    async def find_one(self, query, projection=None):
+        return next((dict(doc) for doc in self.documents.values() if self._matches(doc, query)), None)
+    
+    async def find_one_and_update(self, query, update, projection=None, sort=None):
+        candidates = [doc for doc in self.documents.values() if self._matches(doc, query)]
+        if sort:
+            field, direction = sort[0]
+            candidates.sort(key=lambda doc: doc[field], reverse=direction < 0)
+        if not candidates:
+            return None
+        candidates[0].update(update["$set"])
+        return {"_id": candidates[0]["_id"]}
+    
+    async def update_one(self, query, update, upsert=False):
+        document = next((doc for doc in self.documents.values() if self._matches(doc, query)), None)
+        if document is None and upsert:
+            document = self.documents[query["_id"]] = {"_id": query["_id"]}
+        if document is not None:
+            document.update(update["$set"])
+        return SimpleNamespace(matched_count=int(document is not None))
+
+class SharedSlotsTest(unittest.IsolatedAsyncioTestCase):
+    """Slot leases shared between processes (each SharedSlots plays one process)"""
+    
+    def setUp(self):
+        self.collection = FakeSlotCollection()
+        patcher = mock.patch.object(SharedSlots, "slots", new_callable=mock.PropertyMock,
+                                    return_value=self.collection)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+    
+    def holder_of(self, lease) -> str:
+        return self.collection.documents[lease.slot_id]["holder"]
+    
+    async def acquire(self, slots: SharedSlots, priority: int = INTERACTIVE, limit: int = 1,
+                      reserved_slots: int = 0, timeout: float = 1.0):
+        lease = await slots.acquire(URL, priority, limit, reserved_slots, timeout)
+        self.addAsyncCleanup(lease.release)
+        return lease
+    
+    async def test_processes_share_the_limit(self):
+        first, second = SharedSlots(poll_seconds=0.01), SharedSlots(poll_seconds=0.01)
+        lease = await self.acquire(first)
+        with self.assertRaises(LLMQueueTimeout):
+            await second.acquire(URL, INTERACTIVE, 1, 0, timeout=0.05)
+        
+        await lease.release()
+        other = await self.acquire(second, timeout=0.05)
+        self.assertEqual(self.holder_of(other), other.holder)
+    
+    async def test_lease_is_renewed_while_held(self):
+        slots = SharedSlots(lease_seconds=0.15, poll_seconds=0.01)
+        lease = await self.acquire(slots)
+        await asyncio.sleep(0.3)
+        # Past the original expiry, but renewed, so no one else gets the slot
+        with self.assertRaises(LLMQueueTimeout):
+            await SharedSlots(poll_seconds=0.01).acquire(URL, INTERACTIVE, 1, 0, timeout=0.05)
+        self.assertEqual(self.holder_of(lease), lease.holder)
+    
+    async def test_expired_lease_is_taken_over(self):
+        crashed, survivor = SharedSlots(lease_seconds=0.1, poll_seconds=0.01), SharedSlots(poll_seconds=0.01)
+        stale = await crashed.acquire(URL, INTERACTIVE, 1, 0, timeout=1.0)
+        # The process dies: its lease is no longer renewed
+        stale._renewal.cancel()
+        
+        lease = await self.acquire(survivor, timeout=1.0)
+        self.assertEqual(lease.slot_id, stale.slot_id)
+        self.assertEqual(self.holder_of(lease), lease.holder)
+        self.assertFalse(await crashed.renew(stale.slot_id, stale.holder))
+    
+    async def test_release_of_a_lost_lease_keeps_the_new_holder(self):
+        crashed, survivor = SharedSlots(lease_seconds=0.1, poll_seconds=0.01), SharedSlots(poll_seconds=0.01)
+        stale = await crashed.acquire(URL, INTERACTIVE, 1, 0, timeout=1.0)
+        stale._renewal.cancel()
+        lease = await self.acquire(survivor, timeout=1.0)
+        
+        await stale.release()
+        self.assertEqual(self.holder_of(lease), lease.holder)
+        with self.assertRaises(LLMQueueTimeout):
+            await crashed.acquire(URL, INTERACTIVE, 1, 0, timeout=0.05)
+    
+    async def test_background_leaves_reserved_slots_to_other_processes(self):
+        worker, api = SharedSlots(poll_seconds=0.01), SharedSlots(poll_seconds=0.01)
+        await self.acquire(worker, BACKGROUND, limit=2, reserved_slots=1)
+        with self.assertRaises(LLMQueueTimeout):
+            await worker.acquire(URL, BACKGROUND, 2, 1, timeout=0.05)
+        await self.acquire(api, INTERACTIVE, limit=2, reserved_slots=1, timeout=0.05)
+    
+    async def test_background_waits_while_interactive_requests_wait(self):
+        worker, api = SharedSlots(poll_seconds=0.05), SharedSlots(poll_seconds=0.05)
+        lease = await self.acquire(worker, BACKGROUND, limit=2, reserved_slots=0)
+        await self.acquire(api, INTERACTIVE, limit=2, reserved_slots=0)
+        waiting = asyncio.create_task(api.acquire(URL, INTERACTIVE, 2, 0, timeout=1.0))
+        await asyncio.sleep(0.02)
+        
+        # A free slot appears, but the waiting interactive request gets it
+        await lease.release()
+        with self.assertRaises(LLMQueueTimeout):
+            await worker.acquire(URL, BACKGROUND, 2, 0, timeout=0.1)
+        self.addAsyncCleanup((await waiting).release)
+
+if __name__ == "__main__":
+    unittest.main()
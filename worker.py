@@ -0,0 +1,93 @@
+# worker.py
+import argparse
+import asyncio
+import signal
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from app.config import (
+    EXTRACTION_WORKER_CONCURRENCY, MONGODB_ENSURE_INDEXES, SEMANTIC_MEMORY_ENABLED,
+    WORKER_METRICS_HOST, WORKER_METRICS_PORT
+)
+from app.services.fact_history import compact_legacy_facts
+from app.services.indexes import ensure_indexes
+from app.services.intelligence import IntelligenceService
+from app.services.jobs import JobQueue, JobWorker, FACT_EXTRACTION, CONVERSATION_SUMMARY, MESSAGE_EMBEDDING
+from app.services.memory import MemoryService
+from app.services.semantic import SemanticMemory
+from app.services.summary import SummaryService
+from app.services.telemetry import telemetry
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    """Serves the worker's metrics at /metrics"""
+    
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        body = telemetry.render_prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        pass
+
+def start_metrics_server(port: int, host: str = WORKER_METRICS_HOST) -> ThreadingHTTPServer:
+    """Expose /metrics on a background thread"""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def _report_compaction(task: asyncio.Task):
+    """Log the outcome of the legacy facts compaction"""
+    if task.cancelled():
+        return
+    if task.exception():
+        telemetry.error("facts.compaction_failed", task.exception())
+    elif task.result()["records"]:
+        telemetry.log("facts.compacted", **task.result())
+
+async def run_worker(concurrency: int):
+    """Process queued background jobs until interrupted"""
+    memory_service = MemoryService()
+    intelligence = IntelligenceService(memory_service=memory_service)
+    summaries = SummaryService(memory_service=memory_service)
+    handlers = {
+        FACT_EXTRACTION: intelligence.run_extraction_job,
+        CONVERSATION_SUMMARY: summaries.run_summary_job
+    }
+    if SEMANTIC_MEMORY_ENABLED:
+        handlers[MESSAGE_EMBEDDING] = SemanticMemory().run_index_job
+    worker = JobWorker(JobQueue(), handlers=handlers, concurrency=concurrency)
+    
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_event.set)
+    
+    # Drain the legacy facts log alongside the jobs; a no-op once it is empty
+    compaction = asyncio.create_task(asyncio.to_thread(compact_legacy_facts))
+    compaction.add_done_callback(_report_compaction)
+    
+    telemetry.log("worker.started", concurrency=concurrency)
+    await worker.run(stop_event)
+
+def main():
+    """Run the background worker (fact extraction, conversation summaries, message embeddings)"""
+    parser = argparse.ArgumentParser(description="Run background job workers")
+    parser.add_argument("--concurrency", type=int, default=EXTRACTION_WORKER_CONCURRENCY,
+                        help="Number of jobs processed concurrently")
+    args = parser.parse_args()
+    
+    if MONGODB_ENSURE_INDEXES:
+        for collection_name, error in ensure_indexes()["errors"].items():
+            telemetry.error("indexes.ensure_failed", collection=collection_name, detail=error)
+    if WORKER_METRICS_PORT:
+        start_metrics_server(WORKER_METRICS_PORT)
+    asyncio.run(run_worker(args.concurrency))
+
+if __name__ == "__main__":
+    main()